@@ -0,0 +1,93 @@
+"""Analytics aggregation time: the former pandas version versus the NumPy one.
+
+Only the data preparation is timed, chart rendering is the same for both.
+The pandas version needs pandas installed, which the bot itself no longer does.
+
+    python benchmarks/analytics_aggregation.py [--sizes 10 100 1000] [--repeat 50]
+"""
+import argparse
+import timeit
+
+from fakes import load_fixture, make_recipe_details
+
+from src.services.analytics_service import (CALORIE_EDGES, CALORIE_LABELS, HEALTH_EDGES, HEALTH_LABELS,
+                                            USD_TO_RUB, bin_counts, extract_columns, top_ingredients)
+from src.services.recipe_service import _build_card
+from src.services.recipe_store import RecipeRecord
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def build_records(count):
+    fixture = load_fixture()
+    records = []
+    for recipe_id in range(1, count + 1):
+        details = make_recipe_details(fixture, recipe_id)
+        records.append(RecipeRecord.from_dict(_build_card(details, details, details['title'])))
+    return records
+
+
+def pandas_aggregation(records, ingredient_names):
+    # What the chart functions used to do: a DataFrame of dicts per chart
+    recipes = [{'title': r.title, 'calories': r.calories, 'healthScore': r.health_score,
+                'pricePerServing': r.price_per_serving} for r in records]
+    nutrition = pd.DataFrame(recipes)
+    nutrition = (nutrition['calories'].tolist(), nutrition['healthScore'].tolist())
+
+    health = pd.DataFrame(recipes)
+    health['health_category'] = pd.cut(health['healthScore'], bins=[0, 25, 50, 75, 100], labels=HEALTH_LABELS)
+    health_dist = health['health_category'].value_counts()
+
+    calories = pd.DataFrame(recipes)
+    calories['calorie_category'] = pd.cut(calories['calories'], bins=[0, 300, 600, 900, float('inf')],
+                                          labels=CALORIE_LABELS)
+    calorie_dist = calories['calorie_category'].value_counts()
+
+    prices = [(recipe['pricePerServing'] / 100) * USD_TO_RUB for recipe in recipes]
+    ingredients = pd.Series(ingredient_names).value_counts()[:10]
+    return nutrition, health_dist, calorie_dist, prices, ingredients
+
+
+def numpy_aggregation(records, ingredient_names):
+    columns = extract_columns(records)
+    return (
+        (columns['calories'].tolist(), columns['healthScore'].tolist()),
+        bin_counts(columns['healthScore'], HEALTH_EDGES).tolist(),
+        bin_counts(columns['calories'], CALORIE_EDGES).tolist(),
+        (columns['pricePerServing'] / 100 * USD_TO_RUB).tolist(),
+        top_ingredients(ingredient_names)
+    )
+
+
+def best_time(aggregate, records, ingredient_names, repeat):
+    timer = timeit.Timer(lambda: aggregate(records, ingredient_names))
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    if pd is None:
+        print("pandas is not installed, timing the NumPy version only (pip install pandas to compare)")
+
+    print(f"{'recipes':>8} {'pandas':>10} {'numpy':>10} {'speedup':>8}")
+    for size in args.sizes:
+        records = build_records(size)
+        # Ingredient names are already translated by the time they are aggregated
+        ingredient_names = [name for record in records for name in record.ingredients]
+        new = best_time(numpy_aggregation, records, ingredient_names, args.repeat)
+        if pd is None:
+            print(f"{size:>8} {'-':>10} {new * 1000:>8.3f}ms {'-':>8}")
+            continue
+        old = best_time(pandas_aggregation, records, ingredient_names, args.repeat)
+        print(f"{size:>8} {old * 1000:>8.3f}ms {new * 1000:>8.3f}ms {old / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
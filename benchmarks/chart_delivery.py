@@ -0,0 +1,97 @@
+"""Analytics button latency: charts sent one reply_photo at a time versus as one album.
+
+"before" is the former handler loop, one reply_photo per chart; "after" is
+the current ButtonHandlers.handle_button. Both render the same number of
+fresh charts in the worker pool and send them to a fake Telegram where every
+Bot API call takes --telegram-latency seconds. The fake charges an album as
+one call, whatever the size of the upload.
+
+    python benchmarks/chart_delivery.py [--recipes 10] [--telegram-latency 0.3] [--repeat 3]
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from fakes import FakeSpoonacular, install, load_fixture, make_recipe_details, make_update
+
+from src.bot.handlers import ANALYTICS_CAPTIONS, ButtonHandlers
+from src.services.recipe_service import _build_card
+from src.services.recipe_store import recipe_store, session_store
+
+USER_ID = 1
+
+
+async def start_session(first_id, count):
+    """A session with `count` recipes no chart has been rendered for yet."""
+    fixture = load_fixture()
+    await session_store.start(USER_ID)
+    for recipe_id in range(first_id, first_id + count):
+        details = make_recipe_details(fixture, recipe_id)
+        recipe_store.add(_build_card(details, details, details['title']))
+        await session_store.append(USER_ID, recipe_id)
+    return await recipe_store.get_many(await session_store.get_recipe_ids(USER_ID))
+
+
+async def send_one_by_one(update, records):
+    # The analytics branch of handle_button before charts were sent as an album
+    from src.services.analytics_service import generate_analytics, remember_chart_file_id
+
+    analytics_data = await generate_analytics(records)
+    for name, caption in ANALYTICS_CAPTIONS.items():
+        chart = analytics_data[name]
+        message = await update.callback_query.message.reply_photo(photo=chart.photo, caption=caption)
+        remember_chart_file_id(chart, message.photo[-1].file_id)
+
+
+async def send_album(update, records):
+    await ButtonHandlers.handle_button(update, None)
+
+
+async def measure(send, args, first_id):
+    records = await start_session(first_id, args.recipes)
+    update, _, sent = make_update(USER_ID, data="analytics", telegram_latency=args.telegram_latency)
+    started = time.perf_counter()
+    await send(update, records)
+    return time.perf_counter() - started, len(sent)
+
+
+async def run(args):
+    from src.services.analytics_service import warm_up_chart_pool
+    await asyncio.gather(*map(asyncio.wrap_future, warm_up_chart_pool()))
+
+    results = {"before": [], "after": []}
+    calls = {}
+    # Alternate, so both see the same machine load; fresh recipe IDs every run keep the chart cache cold
+    for run_index in range(args.repeat):
+        for offset, (mode, send) in enumerate((("before", send_one_by_one), ("after", send_album))):
+            seconds, calls[mode] = await measure(send, args, (run_index * 2 + offset + 1) * 10000)
+            results[mode].append(seconds)
+    return results, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=10, help="recipes in the session")
+    parser.add_argument('--telegram-latency', type=float, default=0.3, help="seconds per Bot API call")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            install(FakeSpoonacular(), cache_dir)
+            results, calls = asyncio.run(run(args))
+    finally:
+        from src.services.analytics_service import shutdown_chart_pool
+        shutdown_chart_pool()
+
+    before, after = statistics.median(results["before"]), statistics.median(results["after"])
+    print(f"{'mode':<8}{'Bot API calls':>15}{'median s':>10}")
+    print(f"{'before':<8}{calls['before']:>15}{before:>10.2f}")
+    print(f"{'after':<8}{calls['after']:>15}{after:>10.2f}")
+    print(f"saved per analytics request: {before - after:.2f}s ({1 - after / before:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Offline stand-ins for Spoonacular, Google Translate and Telegram used by the benchmarks."""
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import types
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import httpx
+
+FIXTURE_PATH = os.path.join(ROOT, 'tests', 'test.json')
+FAKE_BASE_URL = "http://spoonacular.fake"
+
+
+def load_fixture(path=FIXTURE_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def make_recipe_details(fixture, recipe_id):
+    """Fixture recipe under another ID, with distinct texts and numbers so caches don't merge them."""
+    rng = random.Random(recipe_id)
+    details = dict(fixture)
+    details.update(
+        id=recipe_id,
+        title=f"{fixture['title']} #{recipe_id}",
+        summary=f"{fixture['summary']} Variation {recipe_id}.",
+        instructions="\n".join(f"{line} ({recipe_id})" for line in fixture['instructions'].split("\n")),
+        healthScore=rng.randint(0, 100),
+        pricePerServing=round(rng.uniform(50, 1500), 2),
+        nutrition={"nutrients": [{"name": "Calories", "amount": round(rng.uniform(80, 1400), 2),
+                                  "unit": "kcal"}]}
+    )
+    return details
+
+
+class FakeSpoonacular:
+    """Answers findByIngredients, information and informationBulk from the fixture.
+
+    `latency` seconds are added to every response and `error_rate` of the
+    requests fail with HTTP 503.
+    """
+
+    def __init__(self, fixture=None, latency=0.0, error_rate=0.0, seed=0):
+        self.fixture = fixture or load_fixture()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._random = random.Random(seed)
+
+    def search(self, ingredients, number):
+        """Deterministic recipe IDs for an ingredient query."""
+        base = sum(ord(char) for char in ",".join(sorted(ingredients))) * 100
+        return [{"id": base + i, "title": f"{self.fixture['title']} #{base + i}",
+                 "image": self.fixture['image'], "usedIngredientCount": len(ingredients),
+                 "missedIngredientCount": 0}
+                for i in range(number)]
+
+    def respond(self, path, params):
+        """Status code and JSON body for a request."""
+        if self._random.random() < self.error_rate:
+            return 503, {"status": "failure", "message": "fake outage"}
+        if path.endswith("/findByIngredients"):
+            self.requests['findByIngredients'] += 1
+            ingredients = [i for i in params.get('ingredients', '').split(',') if i]
+            return 200, self.search(ingredients, int(params.get('number', 10)))
+        if path.endswith("/informationBulk"):
+            self.requests['informationBulk'] += 1
+            ids = [int(i) for i in params.get('ids', '').split(',') if i]
+            return 200, [make_recipe_details(self.fixture, recipe_id) for recipe_id in ids]
+        if path.endswith("/information"):
+            self.requests['information'] += 1
+            return 200, make_recipe_details(self.fixture, int(path.split('/')[-2]))
+        return 404, {"status": "failure", "message": "unknown endpoint"}
+
+    async def handle(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        status, body = self.respond(request.url.path, dict(request.url.params))
+        return httpx.Response(status, json=body)
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+
+class FakeSpoonacularServer:
+    """Serves a FakeSpoonacular over real HTTP/1.1 on localhost, keep-alive included.
+
+        async with FakeSpoonacularServer(FakeSpoonacular(latency=0.05)) as server:
+            install(server.spoonacular, cache_dir, base_url=server.base_url)
+    """
+
+    def __init__(self, spoonacular, host="127.0.0.1", port=0):
+        self.spoonacular = spoonacular
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+
+                url = urlsplit(request_line.decode("latin-1").split()[1])
+                if self.spoonacular.latency:
+                    await asyncio.sleep(self.spoonacular.latency)
+                status, body = self.spoonacular.respond(url.path, dict(parse_qsl(url.query)))
+                payload = json.dumps(body).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class FakeTranslator:
+    """Drop-in for deep_translator.GoogleTranslator that counts upstream calls.
+
+    Echoes the text back, so batch delimiters survive like they do upstream.
+    """
+
+    latency = 0.0
+    calls = 0
+    characters = 0
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+
+    def translate(self, text):
+        FakeTranslator.calls += 1
+        FakeTranslator.characters += len(text)
+        if FakeTranslator.latency:
+            time.sleep(FakeTranslator.latency)
+        return text.strip()
+
+    @classmethod
+    def reset(cls):
+        cls.calls = 0
+        cls.characters = 0
+
+
+_message_ids = itertools.count(1)
+
+
+class FakeTelegramMessage:
+    """Records what handlers send instead of calling the Bot API.
+
+    Every call waits `latency` seconds, like a round trip to Telegram would.
+    """
+
+    def __init__(self, sent, latency=0.0, text=None):
+        self.sent = sent
+        self.latency = latency
+        self.text = text
+        self.message_id = next(_message_ids)
+        self.photo = [types.SimpleNamespace(file_id=f"file-{self.message_id}")]
+
+    async def _call(self, kind, content):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((kind, content))
+        return FakeTelegramMessage(self.sent, self.latency)
+
+    async def reply_text(self, text, **kwargs):
+        return await self._call("text", text)
+
+    async def reply_photo(self, photo, caption=None, **kwargs):
+        return await self._call("photo", caption)
+
+    async def reply_media_group(self, media, **kwargs):
+        first = await self._call("album", [item.caption for item in media])
+        return (first, *(FakeTelegramMessage(self.sent, self.latency) for _ in media[1:]))
+
+    async def edit_text(self, text, **kwargs):
+        return await self._call("edit", text)
+
+    async def delete(self):
+        await self._call("delete", None)
+
+
+class FakeCallbackQuery:
+    def __init__(self, data, message):
+        self.data = data
+        self.message = message
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+def make_update(user_id, text=None, data=None, telegram_latency=0.0):
+    """Update and context for a text message or a button press, plus the list of what the bot sent."""
+    sent = []
+    message = FakeTelegramMessage(sent, telegram_latency, text)
+    update = types.SimpleNamespace(
+        effective_user=types.SimpleNamespace(id=user_id),
+        effective_chat=types.SimpleNamespace(id=user_id),
+        message=message if data is None else None,
+        callback_query=FakeCallbackQuery(data, message) if data is not None else None
+    )
+    context = types.SimpleNamespace(user_data={}, bot_data={})
+    return update, context, sent
+
+
+def _redirect_store(store, path):
+    store.close()
+    store.path = path
+
+
+def install(spoonacular, cache_dir, translator_cls=FakeTranslator, base_url=None, scheduler=None):
+    """Point the bot's services at the fakes and keep their caches in `cache_dir`.
+
+    With `base_url` the client talks HTTP to a FakeSpoonacularServer there,
+    otherwise to `spoonacular` in process. `scheduler` applies upstream
+    rate limits, none by default.
+    """
+    from config.config import SPOONACULAR_API_KEY
+    from src.services import ingredient_lexicon, recipe_service, translator
+    from src.services.spoonacular_client import SpoonacularClient
+    from src.utils.cache import LRUCache
+
+    if base_url is None:
+        recipe_service.spoonacular_client = SpoonacularClient(
+            SPOONACULAR_API_KEY, base_url=FAKE_BASE_URL, transport=spoonacular.transport(), retries=1,
+            scheduler=scheduler
+        )
+    else:
+        recipe_service.spoonacular_client = SpoonacularClient(
+            SPOONACULAR_API_KEY, base_url=base_url, retries=1, scheduler=scheduler
+        )
+    translator.GoogleTranslator = translator_cls
+    translator._local.__dict__.clear()
+
+    for cache, name in ((recipe_service.recipe_cache, 'recipes'), (translator.translation_cache, 'translations')):
+        _redirect_store(cache.store, os.path.join(cache_dir, f'{name}.sqlite3'))
+        cache.memory = LRUCache(max_size=cache.memory.max_size, ttl=cache.memory.ttl)
+    _redirect_store(ingredient_lexicon.ingredient_lexicon.learned, os.path.join(cache_dir, 'ingredients.sqlite3'))
+    recipe_service.search_cache = type(recipe_service.search_cache)(
+        max_size=512, ttl=recipe_service.search_cache.ttl, stale_ttl=recipe_service.search_cache.stale_ttl
+    )
+    # Fresh local index, so earlier runs don't answer searches the benchmark expects upstream
+    _redirect_store(recipe_service.recipe_index.store, os.path.join(cache_dir, 'recipe_index.sqlite3'))
+    recipe_service.recipe_index = type(recipe_service.recipe_index)(recipe_service.recipe_index.store)
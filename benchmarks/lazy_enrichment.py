@@ -0,0 +1,53 @@
+"""Translation calls per session with eager versus lazy recipe enrichment.
+
+A session searches for recipes, opens the result cards and reads the
+instructions of some of them, against offline fakes of Spoonacular and
+the translator.
+
+    python benchmarks/lazy_enrichment.py [--recipes 10] [--cards 5] [--instructions 1]
+"""
+import argparse
+import asyncio
+import tempfile
+
+from fakes import FakeSpoonacular, FakeTranslator, install
+
+from src.services import recipe_service
+from src.services.recipe_store import RecipeRecord
+
+
+async def run_session(recipes, cards, instructions):
+    results = [recipe async for recipe in recipe_service.iter_recipes(["salmon", "egg"], number=recipes)]
+    shown = [RecipeRecord.from_dict(recipe) for recipe in results[:cards]]
+    await recipe_service.ensure_summaries(shown)
+    for recipe in shown[:instructions]:
+        await recipe_service.get_recipe_instructions(recipe)
+
+
+def measure(lazy, args):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        install(FakeSpoonacular(), cache_dir)
+        recipe_service.LAZY_ENRICHMENT = lazy
+        FakeTranslator.reset()
+        asyncio.run(run_session(args.recipes, args.cards, args.instructions))
+        return FakeTranslator.calls, FakeTranslator.characters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=10, help="recipes per search")
+    parser.add_argument('--cards', type=int, default=5, help="result cards shown")
+    parser.add_argument('--instructions', type=int, default=1, help="recipes whose instructions are opened")
+    args = parser.parse_args()
+
+    eager_calls, eager_chars = measure(False, args)
+    lazy_calls, lazy_chars = measure(True, args)
+    print(f"{'mode':<8}{'calls':>8}{'characters':>14}")
+    print(f"{'eager':<8}{eager_calls:>8}{eager_chars:>14}")
+    print(f"{'lazy':<8}{lazy_calls:>8}{lazy_chars:>14}")
+    print(f"saved per session: {eager_calls - lazy_calls} calls, {eager_chars - lazy_chars} characters "
+          f"({1 - lazy_chars / eager_chars:.0%} of translated text)")
+
+
+if __name__ == '__main__':
+    main()
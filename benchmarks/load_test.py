@@ -0,0 +1,222 @@
+"""End-to-end load test: simulated users drive the bot handlers against local fakes.
+
+Every user sends a list of ingredients, picks a search type, opens a
+filter, the instructions of one recipe and the analytics charts. Updates
+go through the same per-user update processor as in production; Spoonacular
+is a fake HTTP server on localhost, the translator and Telegram are fakes
+too. Queries are Zipf-distributed and seeded, so runs are comparable.
+
+    python benchmarks/load_test.py [--users 200] [--concurrency 32] [--api-latency 0.1]
+    python benchmarks/load_test.py --compare benchmarks/results/load_test-20260101-120000.json
+
+Results are saved as JSON in benchmarks/results/ unless --output is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from fakes import ROOT, FakeSpoonacular, FakeSpoonacularServer, FakeTranslator, install, make_update
+
+from src.bot.handlers import ButtonHandlers, MessageHandlers
+from src.bot.update_processor import PerUserUpdateProcessor
+from src.services import recipe_service
+from src.services.recipe_store import session_store
+from src.services.state_backend import InProcessBackend
+from src.services.upstream_scheduler import upstream_scheduler
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+FLOWS = ("message", "search", "filter", "instructions", "analytics")
+PERCENTILES = (50, 95, 99)
+INGREDIENTS = ("курица", "рис", "томаты", "лук", "чеснок", "картофель", "морковь", "сыр", "яйца", "молоко",
+               "грибы", "говядина", "лосось", "перец", "шпинат", "макароны", "фасоль", "капуста", "тыква", "яблоки")
+FILTERS = ("most_caloric", "most_healthy", "show_all")
+
+
+def zipf_queries(count, seed, exponent=1.1, max_ingredients=3):
+    """Ingredient lists where a few popular ones repeat a lot, as in real searches."""
+    rng = random.Random(seed)
+    weights = [1 / rank ** exponent for rank in range(1, len(INGREDIENTS) + 1)]
+    queries = []
+    for _ in range(count):
+        picked = set(rng.choices(INGREDIENTS, weights, k=rng.randint(1, max_ingredients)))
+        queries.append(", ".join(sorted(picked)))
+    return queries
+
+
+def percentile(values, p):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.processor = PerUserUpdateProcessor(args.concurrency, InProcessBackend())
+        self.latencies = {flow: [] for flow in FLOWS}
+        self.errors = dict.fromkeys(FLOWS, 0)
+        self.rng = random.Random(args.seed)
+
+    async def send(self, flow, callback, user_id, text=None, data=None):
+        """Process one update and record its latency, queueing in the processor included."""
+        update, context, _ = make_update(user_id, text=text, data=data, telegram_latency=self.args.telegram_latency)
+        started = time.perf_counter()
+        try:
+            await self.processor.process_update(update, callback(update, context))
+        except Exception:
+            self.errors[flow] += 1
+        self.latencies[flow].append(time.perf_counter() - started)
+
+    async def user_session(self, user_id, query):
+        await self.send("message", MessageHandlers.handle_message, user_id, text=query)
+        await self.send("search", ButtonHandlers.handle_search_type, user_id,
+                        data=self.rng.choice(("strict_search", "flexible_search")))
+        await self.send("filter", ButtonHandlers.handle_button, user_id, data=self.rng.choice(FILTERS))
+        recipe_ids = await session_store.get_recipe_ids(user_id)
+        if recipe_ids:
+            await self.send("instructions", ButtonHandlers.handle_button, user_id,
+                            data=f"instructions_{self.rng.choice(list(recipe_ids))}")
+        if self.rng.random() < self.args.analytics_share:
+            await self.send("analytics", ButtonHandlers.handle_button, user_id, data="analytics")
+
+    async def run(self, queries):
+        # Users arrive while others are still busy, up to `users_in_flight` at once
+        in_flight = asyncio.Semaphore(self.args.users_in_flight or self.args.concurrency * 2)
+
+        async def user(user_id, query):
+            async with in_flight:
+                await self.user_session(user_id, query)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(user_id, query) for user_id, query in enumerate(queries, 1)))
+        return time.perf_counter() - started
+
+
+def summarize(latencies, errors):
+    flows = {}
+    for flow, values in latencies.items():
+        if not values:
+            continue
+        flows[flow] = {"count": len(values), "errors": errors[flow], "mean": sum(values) / len(values),
+                       **{f"p{p}": percentile(values, p) for p in PERCENTILES}}
+    return flows
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load_test(args):
+    if not args.cold_analytics:
+        # As with ANALYTICS_PRELOAD, chart workers are up before the first request
+        from src.services.analytics_service import warm_up_chart_pool
+        await asyncio.gather(*map(asyncio.wrap_future, warm_up_chart_pool()))
+
+    FakeTranslator.latency = args.translator_latency
+    FakeTranslator.reset()
+    spoonacular = FakeSpoonacular(latency=args.api_latency, error_rate=args.error_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        async with FakeSpoonacularServer(spoonacular) as server:
+            install(spoonacular, cache_dir, base_url=server.base_url,
+                    scheduler=upstream_scheduler if args.rate_limits else None)
+            if args.rate_limits:
+                upstream_scheduler.bind(asyncio.get_running_loop())
+            load_test = LoadTest(args)
+            try:
+                duration = await load_test.run(zipf_queries(args.users, args.seed))
+            finally:
+                await recipe_service.close_client()
+
+    updates = sum(len(values) for values in load_test.latencies.values())
+    return {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "revision": git_revision(),
+        "parameters": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "duration": duration,
+        "updates": updates,
+        "updates_per_second": updates / duration,
+        "flows": summarize(load_test.latencies, load_test.errors),
+        "upstream": {"spoonacular": dict(spoonacular.requests), "translator_calls": FakeTranslator.calls,
+                     "translator_characters": FakeTranslator.characters}
+    }
+
+
+def print_report(result):
+    print(f"{'flow':<14}{'count':>7}{'errors':>8}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    for flow, stats in result["flows"].items():
+        print(f"{flow:<14}{stats['count']:>7}{stats['errors']:>8}"
+              + "".join(f"{stats[f'p{p}'] * 1000:>10.1f}" for p in PERCENTILES))
+    upstream = result["upstream"]
+    print(f"{result['updates']} updates in {result['duration']:.2f}s: {result['updates_per_second']:.1f} updates/s")
+    print(f"spoonacular requests: {sum(upstream['spoonacular'].values())} {upstream['spoonacular']}, "
+          f"translator calls: {upstream['translator_calls']}")
+
+
+def print_comparison(result, baseline):
+    """Relative change against an earlier run; positive means slower for latencies."""
+    if baseline["parameters"] != result["parameters"]:
+        print("warning: the baseline was run with other parameters")
+    print(f"\nagainst {baseline['timestamp']} ({baseline.get('revision') or 'unknown revision'}):")
+    for flow, stats in result["flows"].items():
+        before = baseline["flows"].get(flow)
+        if before is None:
+            continue
+        changes = "".join(f"{f'p{p}':>6} {_change(before[f'p{p}'], stats[f'p{p}']):>8}" for p in PERCENTILES)
+        print(f"{flow:<14}{changes}")
+    print(f"{'updates/s':<14}{_change(baseline['updates_per_second'], result['updates_per_second']):>15}")
+
+
+def _change(before, after):
+    return f"{(after - before) / before:+.1%}" if before else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help="simulated users, one session each")
+    parser.add_argument('--concurrency', type=int, default=32, help="updates processed at once, as CONCURRENT_UPDATES")
+    parser.add_argument('--users-in-flight', type=int, default=None,
+                        help="users active at once (default: twice the concurrency)")
+    parser.add_argument('--api-latency', type=float, default=0.1, help="seconds per Spoonacular response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of Spoonacular requests failing with 503")
+    parser.add_argument('--translator-latency', type=float, default=0.05, help="seconds per translator call")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="seconds per Bot API call")
+    parser.add_argument('--analytics-share', type=float, default=0.3, help="share of users opening analytics")
+    parser.add_argument('--cold-analytics', action='store_true',
+                        help="start chart workers on the first analytics request instead of ahead of the run")
+    parser.add_argument('--rate-limits', action='store_true', help="apply the configured upstream rate limits")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="result file (default: benchmarks/results/load_test-<time>.json)")
+    parser.add_argument('--compare', help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    try:
+        result = asyncio.run(run_load_test(args))
+    finally:
+        # Loaded by the analytics flow; its workers must not outlive the run
+        from src.services.analytics_service import shutdown_chart_pool
+        shutdown_chart_pool()
+
+    print_report(result)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(result, json.load(f))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
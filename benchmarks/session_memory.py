@@ -0,0 +1,87 @@
+"""Memory held by search sessions: per-user recipe dicts versus shared records.
+
+Simulates active users whose last search returned recipes drawn from a pool
+of popular recipes (Zipf-distributed, as real searches repeat a lot).
+
+    python benchmarks/session_memory.py [--users 10000] [--recipes-per-session 5] [--pool 500]
+"""
+import argparse
+import asyncio
+import json
+import random
+import tracemalloc
+
+from fakes import load_fixture, make_recipe_details
+
+from src.services.recipe_service import _build_card, _extract_instructions
+from src.services.recipe_store import RecipeStore, SessionStore
+from src.services.state_backend import InProcessBackend
+
+
+def build_pool(size):
+    """Recipe dicts as recipe_service produces them, with summary and instructions filled in."""
+    fixture = load_fixture()
+    pool = []
+    for recipe_id in range(1, size + 1):
+        details = make_recipe_details(fixture, recipe_id)
+        recipe = _build_card(details, details, details['title'])
+        recipe.update(summary=details['summary'], instructions=_extract_instructions(details))
+        pool.append(recipe)
+    return pool
+
+
+def draw_sessions(pool, users, per_session, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(pool) + 1)]
+    return [rng.choices(pool, weights=weights, k=per_session) for _ in range(users)]
+
+
+def per_user_dicts(sessions):
+    # Every search used to return fresh dicts stored in that user's user_data
+    return {user_id: [json.loads(json.dumps(recipe)) for recipe in recipes]
+            for user_id, recipes in enumerate(sessions)}
+
+
+def shared_records(sessions):
+    recipe_store = RecipeStore(max_size=len(sessions) * len(sessions[0]))
+    session_store = SessionStore(InProcessBackend(max_keys=len(sessions)), idle_ttl=3600)
+
+    async def fill():
+        for user_id, recipes in enumerate(sessions):
+            await session_store.start(user_id)
+            for recipe in recipes:
+                await session_store.append(user_id, recipe_store.add(json.loads(json.dumps(recipe))).id)
+
+    asyncio.run(fill())
+    return recipe_store, session_store
+
+
+def measure(build, sessions):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(sessions)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--recipes-per-session', type=int, default=5)
+    parser.add_argument('--pool', type=int, default=500, help="distinct recipes users find")
+    args = parser.parse_args()
+
+    sessions = draw_sessions(build_pool(args.pool), args.users, args.recipes_per_session)
+    old = measure(per_user_dicts, sessions)
+    new = measure(shared_records, sessions)
+    scale = 10000 / args.users
+    print(f"{args.users} users, {args.recipes_per_session} recipes per session, {args.pool} distinct recipes")
+    print(f"per-user dicts:  {old / 2**20:8.1f} MB")
+    print(f"shared records:  {new / 2**20:8.1f} MB")
+    print(f"saved per 10k active users: {(old - new) * scale / 2**20:.1f} MB ({1 - new / old:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Startup benchmark: import time and memory of the bot entry point.
+
+Each measurement runs in a fresh interpreter so module caches don't carry over.
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: import the modules, then report wall time and peak RSS
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss_kb //= 1024
+heavy = [m for m in ('pandas', 'matplotlib', 'numpy', 'seaborn') if m in sys.modules]
+print(json.dumps({'seconds': elapsed, 'rss_mb': rss_kb / 1024, 'heavy_modules': heavy}))
+"""
+
+# main imports the bot modules only once it builds the application
+SCENARIOS = {
+    'entry point (main)': ['main', 'src.bot.handlers'],
+    'entry point + analytics': ['main', 'src.bot.handlers', 'src.services.analytics_service'],
+}
+
+
+def measure(modules):
+    output = subprocess.run([sys.executable, '-c', PROBE, *modules], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, modules in SCENARIOS.items():
+        results = [measure(modules) for _ in range(args.runs)]
+        seconds = statistics.median(result['seconds'] for result in results)
+        rss_mb = statistics.median(result['rss_mb'] for result in results)
+        heavy = ', '.join(results[0]['heavy_modules']) or '-'
+        print(f"{name:<28} import {seconds * 1000:7.0f} ms   RSS {rss_mb:6.1f} MB   heavy modules: {heavy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,84 @@ TELEGRAM_TOKEN = "YOUR_TELEGRAM_BOT_TOKEN"
 SPOONACULAR_API_KEY = "YOUR_SPOONACULAR_API_KEY"
 LOGGING_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 LOGGING_LEVEL = 'INFO'
+
+# Spoonacular HTTP client
+SPOONACULAR_TIMEOUT = 10  # seconds per request
+SPOONACULAR_MAX_CONCURRENCY = 5  # simultaneous requests / pooled connections
+SPOONACULAR_RETRIES = 3  # attempts per request, with exponential backoff
+SPOONACULAR_BULK_CHUNK_SIZE = 50  # recipe IDs per informationBulk request
+
+# Upstream rate limits, shared by all users
+SPOONACULAR_RATE_LIMIT = 1  # requests per second on average
+SPOONACULAR_RATE_BURST = 5  # requests allowed at once after a quiet period
+SPOONACULAR_QUOTA_RESERVE = 10  # daily quota points background work leaves for user requests
+TRANSLATOR_RATE_LIMIT = 5  # Google Translate requests per second on average
+TRANSLATOR_RATE_BURST = 10
+
+# Recipe detail cache
+RECIPE_CACHE_PATH = "cache/recipes.sqlite3"
+RECIPE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+RECIPE_CACHE_MAX_ENTRIES = 10000  # on-disk entries before LRU eviction
+RECIPE_CACHE_MEMORY_SIZE = 256  # entries kept in memory
+
+# Search result cache
+SEARCH_CACHE_MAX_SIZE = 512  # cached ingredient queries kept in memory
+SEARCH_CACHE_TTL = 60 * 60  # seconds a result is served as fresh
+SEARCH_CACHE_STALE_TTL = 6 * 60 * 60  # seconds a stale result is served while refreshing, 0 disables
+
+# Translation cache
+TRANSLATION_CACHE_PATH = "cache/translations.sqlite3"
+TRANSLATION_CACHE_MAX_ENTRIES = 100000  # on-disk entries before LRU eviction
+TRANSLATION_CACHE_MEMORY_SIZE = 4096  # entries kept in memory
+
+# Ingredient dictionary entries learned from online translations
+INGREDIENT_LEXICON_LEARNED_PATH = "cache/ingredients.sqlite3"
+
+# Analytics chart rendering
+ANALYTICS_WORKERS = 2  # processes rendering charts in parallel
+CHART_CACHE_MAX_BYTES = 32 * 1024 * 1024  # rendered PNGs kept in memory
+CHART_FILE_ID_CACHE_SIZE = 4096  # Telegram file_ids of uploaded charts
+ANALYTICS_PRELOAD = False  # load pandas/matplotlib and start workers right after startup instead of on first use
+
+# Search
+RECIPES_PER_SEARCH = 1  # recipes requested from Spoonacular per search
+LAZY_ENRICHMENT = True  # translate summaries and instructions only when they are shown
+
+# Local ingredient index of every recipe fetched, answering searches without Spoonacular
+RECIPE_INDEX_PATH = "cache/recipe_index.sqlite3"
+RECIPE_INDEX_MAX_ENTRIES = 50000  # indexed recipes kept on disk
+RECIPE_INDEX_MIN_COVERAGE = 0.8  # share of requested ingredient slots local results must fill, above 1 disables
+RECIPE_INDEX_DUMPS = []  # JSON dumps of recipe details indexed at startup, e.g. ["tests/test.json"]
+
+# Background prewarming of the most frequent searches, both strict and flexible
+PREWARM_INTERVAL = 15 * 60  # seconds between runs, None disables
+PREWARM_TOP_QUERIES = 10  # most frequent ingredient queries kept warm
+PREWARM_QUOTA_HEADROOM = 100  # Spoonacular points beyond SPOONACULAR_QUOTA_RESERVE needed to run
+PREWARM_ANALYTICS = False  # also render the charts of prewarmed searches; loads matplotlib and starts the chart workers
+QUERY_LOG_MAX_SIZE = 10000  # distinct ingredient queries counted
+QUERY_LOG_DECAY = 0.5  # counts are multiplied by this after every run, so old trends fade
+
+# Recipe records shared between users and per-user sessions
+RECIPE_STORE_SIZE = 10000  # recipe records kept in memory
+SESSION_IDLE_TTL = 24 * 60 * 60  # seconds of inactivity before a session is dropped
+
+# Per-user state (sessions, typed ingredients) and per-user locks
+STATE_BACKEND = "memory"  # "memory" for a single worker, "redis" to share state between workers
+STATE_MAX_KEYS = 200000  # keys kept in memory by the "memory" backend
+REDIS_URL = "redis://localhost:6379/0"
+USER_LOCK_TIMEOUT = 120  # seconds after which a user lock held by a crashed worker expires
+
+# Update delivery
+BOT_MODE = "polling"  # "polling" or "webhook"
+CONCURRENT_UPDATES = 32  # updates processed at once per worker, one at a time per user (in order with the "memory" backend); 0 processes them in order
+WEBHOOK_URL = "https://example.com/telegram"  # public URL Telegram posts updates to
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "telegram"  # path the local server listens on, usually the path of WEBHOOK_URL
+WEBHOOK_SECRET_TOKEN = None  # checked on every request when set
+WEBHOOK_WORKERS = 1  # processes sharing the webhook port, more than one needs STATE_BACKEND = "redis"
+
+# Instrumentation
+METRICS_PORT = 9464  # Prometheus /metrics port, worker N of a webhook uses METRICS_PORT + N; None disables
+METRICS_HOST = "127.0.0.1"  # interface /metrics listens on, "0.0.0.0" for a scraper on another host
+METRICS_TRACE_SPANS = False  # log the timed stages of every handled update
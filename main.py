@@ -1,16 +1,81 @@
+import asyncio
+import importlib
 import logging
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from config.config import TELEGRAM_TOKEN, LOGGING_FORMAT, LOGGING_LEVEL
-from src.bot.handlers import MessageHandlers, ButtonHandlers
+import multiprocessing
+import socket
+import sys
+from config.config import (TELEGRAM_TOKEN, LOGGING_FORMAT, LOGGING_LEVEL, ANALYTICS_PRELOAD, RECIPE_INDEX_DUMPS,
+                           BOT_MODE, CONCURRENT_UPDATES, STATE_BACKEND, WEBHOOK_URL, WEBHOOK_LISTEN,
+                           WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_WORKERS,
+                           METRICS_PORT, METRICS_HOST, METRICS_TRACE_SPANS, PREWARM_INTERVAL)
+from src.utils.metrics import metrics, start_metrics_server
+
+# The bot modules (telegram, handlers, services) are imported inside the functions below:
+# chart workers are spawned processes that re-run this file on start, and need none of them
 
 # Configure logging
 logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
 logger = logging.getLogger(__name__)
 
-def main():
-    """Initialize and start the bot."""
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+ANALYTICS_MODULE = "src.services.analytics_service"
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+async def preload_analytics():
+    """Import the plotting stack and start chart workers in the background."""
+    analytics = await asyncio.to_thread(importlib.import_module, ANALYTICS_MODULE)
+    analytics.warm_up_chart_pool()
+    logger.info("Аналитика загружена")
+
+async def load_recipe_dumps():
+    """Fill the local recipe index from the configured JSON dumps."""
+    from src.services.recipe_service import load_recipe_dump
+    for path in RECIPE_INDEX_DUMPS:
+        try:
+            await asyncio.to_thread(load_recipe_dump, path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось загрузить рецепты из {path}: {e}")
+
+async def prewarm(context):
+    """JobQueue callback refreshing the most frequent searches."""
+    from src.services.prewarm import prewarm_popular_searches
+    await prewarm_popular_searches()
+
+async def post_init(application):
+    """Optionally preload analytics and recipe dumps without delaying the start of polling."""
+    from src.services.upstream_scheduler import upstream_scheduler
+    # Translations run in worker threads and queue for their turn on this loop
+    upstream_scheduler.bind(asyncio.get_running_loop())
+    if ANALYTICS_PRELOAD:
+        application.create_task(preload_analytics())
+    if RECIPE_INDEX_DUMPS:
+        application.create_task(load_recipe_dumps())
+
+async def post_shutdown(application):
+    """Release pooled HTTP connections, chart workers and the state backend."""
+    from src.services.recipe_service import close_client
+    from src.services.state_backend import state_backend
+    await close_client()
+    await state_backend.aclose()
+    # Only loaded if analytics was used or preloaded
+    analytics = sys.modules.get(ANALYTICS_MODULE)
+    if analytics is not None:
+        analytics.shutdown_chart_pool()
+
+def build_application(prewarm_searches=True):
+    """Create the bot application with all handlers registered.
+
+    `prewarm_searches` schedules the prewarm job; of several webhook workers only one runs it.
+    """
+    from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+    from src.bot.handlers import MessageHandlers, ButtonHandlers
+    from src.bot.update_processor import PerUserUpdateProcessor
+    from src.services.state_backend import state_backend
+
+    builder = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    if CONCURRENT_UPDATES:
+        # A slow search no longer holds up other users; a user's own updates still run one at a time
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES, state_backend))
+    application = builder.build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", MessageHandlers.start))
@@ -22,9 +87,80 @@ def main():
     application.add_handler(CallbackQueryHandler(ButtonHandlers.handle_button,
         pattern="^(most_caloric|most_healthy|show_all|instructions_.*|analytics)$"))
 
-    # Start the Bot
+    if prewarm_searches and PREWARM_INTERVAL:
+        if application.job_queue is None:
+            logger.warning("Prewarming disabled: the JobQueue needs python-telegram-bot[job-queue]")
+        else:
+            application.job_queue.run_repeating(prewarm, interval=PREWARM_INTERVAL, first=PREWARM_INTERVAL,
+                                                name="prewarm")
+
+    return application
+
+def start_metrics(worker_index=0):
+    """Export metrics, one port per worker process."""
+    metrics.trace_spans = METRICS_TRACE_SPANS
+    if METRICS_PORT is not None:
+        start_metrics_server(METRICS_PORT + worker_index, METRICS_HOST)
+
+def _webhook_socket():
+    """Listening socket on the webhook port that every worker process can bind at once."""
+    sock = socket.socket(socket.AF_INET6 if ":" in WEBHOOK_LISTEN else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if WEBHOOK_WORKERS > 1:
+        # The kernel spreads incoming connections over the workers
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((WEBHOOK_LISTEN, WEBHOOK_PORT))
+    sock.listen(128)
+    sock.setblocking(False)
+    return sock
+
+def run_webhook_worker(worker_index=0):
+    """Serve Telegram updates posted to the webhook port."""
+    start_metrics(worker_index)
+    # SO_REUSEPORT spreads users evenly, so one worker's queries show what is popular
+    # without every worker spending background quota on the same searches
+    build_application(prewarm_searches=worker_index == 0).run_webhook(
+        unix=_webhook_socket(),
+        url_path=WEBHOOK_PATH,
+        webhook_url=WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        allowed_updates=ALLOWED_UPDATES
+    )
+
+def run_webhook():
+    """Run WEBHOOK_WORKERS processes behind one webhook port."""
+    if WEBHOOK_WORKERS <= 1:
+        run_webhook_worker()
+        return
+    if STATE_BACKEND == "memory":
+        raise RuntimeError("Several webhook workers need a shared STATE_BACKEND such as \"redis\"")
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Several webhook workers need SO_REUSEPORT, which this OS lacks")
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_webhook_worker, args=(i,), name=f"webhook-worker-{i}")
+               for i in range(WEBHOOK_WORKERS)]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Запущено обработчиков вебхука: {len(workers)}")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Workers got the signal too and shut down on their own
+        for worker in workers:
+            worker.join()
+
+def main():
+    """Initialize and start the bot."""
     logger.info("Запуск бота..")
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    if BOT_MODE == "webhook":
+        run_webhook()
+    elif BOT_MODE == "polling":
+        start_metrics()
+        build_application().run_polling(allowed_updates=ALLOWED_UPDATES)
+    else:
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE!r}")
 
 
 if __name__ == '__main__':
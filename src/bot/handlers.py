@@ -1,17 +1,38 @@
 DEFAULT_RECIPE_IMAGE = "https://lh3.googleusercontent.com/proxy/FgRa3A2R--m9aYq5RLDbnYgxkWuAW3ZMxxJwGEEPduVM7_f_LFAFLTytF6sV8jXUKZ1lt16ujFn_3JatSiTd"  # or any other default image URL
 
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import time
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
-from src.services.recipe_service import get_recipes, _get_recipe_details
-from src.services.translator import translate_to_english, clean_and_translate_instructions
+from config.config import RECIPES_PER_SEARCH
+from src.services.recipe_service import iter_recipes, ensure_summaries, get_recipe_instructions
+from src.services.recipe_store import recipe_store, session_store, get_session_recipes
+from src.services.ingredient_lexicon import translate_ingredients_to_english
+from src.services.prewarm import query_log
+from src.services.upstream_scheduler import QuotaExceededError, upstream_context
 from src.bot.filters import recipe_filters
-from src.services.analytics_service import generate_analytics
+from src.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between edits of the search progress message
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+QUOTA_EXCEEDED_MESSAGE = "Лимит запросов к сервису рецептов на сегодня исчерпан, попробуйте завтра."
+
+ANALYTICS_CAPTIONS = {
+    'nutrition_comparison': "📊 Сравнение калорийности и полезности рецептов",
+    'health_distribution': "🥗 Распределение рецептов по уровню полезности",
+    'calorie_ranges': "🔥 Распределение рецептов по калорийности",
+    'price_analysis': "💰 Анализ стоимости рецептов",
+    'ingredients_analysis': "🥘 Анализ используемых ингредиентов"
+}
+
 class MessageHandlers:
     @staticmethod
+    @metrics.timed("handler.start", trace=True)
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "Добро пожаловать в Рецепт-бот! 🍳\n\n"
@@ -23,12 +44,13 @@ class MessageHandlers:
         )
 
     @staticmethod
+    @metrics.timed("handler.handle_message", trace=True)
     async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_input = update.message.text
         # logger.info(f"Received message: {user_input}")
         
-        # Store ingredients in context
-        context.user_data['ingredients'] = user_input
+        # Store ingredients in the state backend, the search button may reach another worker
+        await session_store.set_ingredients(update.effective_user.id, user_input)
         
         # Ask user for search preference
         await update.message.reply_text(
@@ -53,8 +75,8 @@ class ButtonHandlers:
     def get_recipe_buttons(recipe):
         buttons = [
             [
-                InlineKeyboardButton("Посмотреть на сайте", url=recipe['url']),
-                InlineKeyboardButton("Инструкция приготовления", callback_data=f"instructions_{str(recipe['id'])}")
+                InlineKeyboardButton("Посмотреть на сайте", url=recipe.url),
+                InlineKeyboardButton("Инструкция приготовления", callback_data=f"instructions_{str(recipe.id)}")
             ]
         ]
         return InlineKeyboardMarkup(buttons)
@@ -71,29 +93,57 @@ class ButtonHandlers:
 
     
     @staticmethod
+    @metrics.timed("handler.handle_search_type", trace=True)
     async def handle_search_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
 
         if query.data in ["strict_search", "flexible_search"]:
+            user_id = update.effective_user.id
+            user_input = await session_store.get_ingredients(user_id)
+            if user_input is None:
+                await query.message.reply_text("Сначала отправьте список ингредиентов")
+                return
+
             # Show processing message
             processing_message = await query.message.reply_text(
                 "🔍 Ищу рецепты по вашим ингредиентам...\nЭто может занять несколько секунд."
             )
             
-            # Get ingredients from context and translate
-            ingredients = [translate_to_english(i.strip()) 
-                        for i in context.user_data['ingredients'].split(",")]
-            
-            # Get recipes with appropriate ranking
             ranking = 1 if query.data == "strict_search" else 2
-            recipes = get_recipes(ingredients, number=1, ranking=ranking)
+            await session_store.start(user_id)
+            recipes = []
+            quota_exceeded = False
+            # Upstream calls queue per user, so one busy chat can't hold up the others
+            with upstream_context(user_id=user_id):
+                # Get ingredients from context and translate
+                ingredients = await asyncio.to_thread(
+                    translate_ingredients_to_english,
+                    [i.strip() for i in user_input.split(",")]
+                )
+                # Popular queries are kept warm in the background
+                query_log.record(ingredients)
+
+                # Get recipes with appropriate ranking, showing progress as each one is ready
+                last_progress_update = time.monotonic()
+                try:
+                    async for recipe in iter_recipes(ingredients, number=RECIPES_PER_SEARCH, ranking=ranking):
+                        record = recipe_store.add(recipe)
+                        await session_store.append(user_id, record.id)
+                        recipes.append(record)
+                        # Throttled, so cached searches that arrive all at once don't cost extra API calls
+                        if time.monotonic() - last_progress_update >= PROGRESS_UPDATE_INTERVAL:
+                            await _update_progress(processing_message, recipes)
+                            last_progress_update = time.monotonic()
+                except QuotaExceededError as e:
+                    logger.warning(f"Search stopped after {len(recipes)} recipes: {e}")
+                    quota_exceeded = True
             
             # Clean up processing message
             await processing_message.delete()
             
-            context.user_data['recipes'] = recipes
-            
+            if quota_exceeded:
+                await query.message.reply_text(QUOTA_EXCEEDED_MESSAGE)
             if recipes:
                 await query.message.reply_text(
                     "Выберите, что вы хотите увидеть:\n" +
@@ -102,34 +152,42 @@ class ButtonHandlers:
                     "Показать все - все найденные рецепты",
                     reply_markup=ButtonHandlers.get_filter_buttons()
                 )
-            else:
+            elif not quota_exceeded:
                 await query.message.reply_text(
                     "К сожалению, рецепты для данных ингредиентов не найдены."
                 )
 
     @staticmethod
+    @metrics.timed("handler.handle_button", trace=True)
     async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
 
         if query.data in ["most_caloric", "most_healthy", "show_all"]:
-            recipes = context.user_data.get('recipes', [])
+            recipes = await get_session_recipes(update.effective_user.id)
             filtered_recipes = recipe_filters[query.data](recipes)
+            # Summaries are translated only for cards actually shown
+            try:
+                with upstream_context(user_id=update.effective_user.id):
+                    await ensure_summaries(filtered_recipes)
+            except QuotaExceededError as e:
+                logger.warning(f"Showing cards without summaries: {e}")
             
             for recipe in filtered_recipes:
                 caption = (
-                    f"🍳 {recipe['title']}\n\n"
-                    f"📝 {_truncate_text(recipe['summary'])}\n\n"
-                    f"🔥 Калории: {recipe['calories']} ккал.\n"
-                    f"💪 Полезность: {recipe['healthScore']}/100"
+                    f"🍳 {recipe.title}\n\n"
+                    f"📝 {_truncate_text(recipe.summary or '')}\n\n"
+                    f"🔥 Калории: {recipe.calories} ккал.\n"
+                    f"💪 Полезность: {recipe.health_score}/100"
                 )
                 
                 try:
-                    await query.message.reply_photo(
-                        photo=recipe['image'],
-                        caption=caption,
-                        reply_markup=ButtonHandlers.get_recipe_buttons(recipe)
-                    )
+                    with metrics.stage("telegram.send_recipe_card"):
+                        await query.message.reply_photo(
+                            photo=recipe.image,
+                            caption=caption,
+                            reply_markup=ButtonHandlers.get_recipe_buttons(recipe)
+                        )
                 except:
                     try:
                         await query.message.reply_photo(
@@ -145,47 +203,70 @@ class ButtonHandlers:
 
         elif query.data.startswith('instructions_'):
             recipe_id = query.data.split('_')[1]
-            recipes = context.user_data.get('recipes', [])
-            recipe = next((r for r in recipes if str(r['id']) == recipe_id), None)
+            recipe = await recipe_store.get(int(recipe_id)) if recipe_id.isdigit() else None
+            try:
+                with upstream_context(user_id=update.effective_user.id):
+                    instructions = await get_recipe_instructions(recipe) if recipe else None
+            except QuotaExceededError:
+                await query.message.reply_text(QUOTA_EXCEEDED_MESSAGE)
+                return
+            except Exception as e:
+                # Spoonacular or the translator failing; the reply below says so
+                logger.warning(f"Failed to get instructions for recipe {recipe_id}: {e}")
+                instructions = None
             
-            if recipe and recipe.get('instructions'):
-                truncated_instructions = _truncate_text(recipe['instructions'], max_length=800, add_site_reference=True)
+            if instructions:
+                truncated_instructions = _truncate_text(instructions, max_length=800, add_site_reference=True)
                 await query.message.reply_text(truncated_instructions)
             else:
                 await query.message.reply_text("Инструкции для этого рецепта недоступны")
         
         elif query.data == "analytics":
-            recipes = context.user_data.get('recipes', [])
+            recipes = await get_session_recipes(update.effective_user.id)
             if recipes:
-                analytics_data = generate_analytics(recipes)
-                
-                await query.message.reply_photo(
-                    photo=analytics_data['nutrition_comparison'],
-                    caption="📊 Сравнение калорийности и полезности рецептов"
-                )
-                
-                await query.message.reply_photo(
-                    photo=analytics_data['health_distribution'],
-                    caption="🥗 Распределение рецептов по уровню полезности"
-                )
-                
-                await query.message.reply_photo(
-                    photo=analytics_data['calorie_ranges'],
-                    caption="🔥 Распределение рецептов по калорийности"
-                )
-                
-                await query.message.reply_photo(
-                    photo=analytics_data['price_analysis'],
-                    caption="💰 Анализ стоимости рецептов"
-                )
-                
-                await query.message.reply_photo(
-                    photo=analytics_data['ingredients_analysis'],
-                    caption="🥘 Анализ используемых ингредиентов"
-                )
+                # NumPy/matplotlib are only loaded once someone asks for analytics
+                from src.services.analytics_service import generate_analytics, remember_chart_file_id
+
+                started = time.perf_counter()
+                analytics_data = await generate_analytics(recipes)
+                rendered = time.perf_counter()
+
+                charts = [(analytics_data[name], caption)
+                          for name, caption in ANALYTICS_CAPTIONS.items() if name in analytics_data]
+                if not charts:
+                    await query.message.reply_text("Не удалось построить аналитику, попробуйте позже")
+                    return
+
+                # One album instead of a photo per chart; an album needs at least two items
+                with metrics.stage("telegram.send_charts"):
+                    if len(charts) > 1:
+                        messages = await query.message.reply_media_group(
+                            media=[InputMediaPhoto(media=chart.photo, caption=caption) for chart, caption in charts]
+                        )
+                    else:
+                        chart, caption = charts[0]
+                        messages = [await query.message.reply_photo(photo=chart.photo, caption=caption)]
+
+                for (chart, _), message in zip(charts, messages):
+                    remember_chart_file_id(chart, message.photo[-1].file_id)
+
+                finished = time.perf_counter()
+                logger.info(f"Analytics sent: {len(charts)} charts in {finished - started:.2f}s "
+                            f"(render {rendered - started:.2f}s, send {finished - rendered:.2f}s)")
             else:
                 await query.message.reply_text("Сначала найдите рецепты для анализа!")
 
+async def _update_progress(message, recipes):
+    """Show how many recipes are ready and the latest one."""
+    try:
+        await message.edit_text(
+            f"🔍 Найдено рецептов: {len(recipes)} из {RECIPES_PER_SEARCH}\n"
+            f"Последний: {recipes[-1].title}\n"
+            "Продолжаю поиск..."
+        )
+    except TelegramError as e:
+        logger.debug(f"Could not update progress message: {e}")
+
 def _truncate_text(text, max_length=800, add_site_reference=False):
     """Truncate text to fit Telegram limits"""
     site_msg = "\n\nПолную инструкцию смотрите на сайте..." if add_site_reference else "..."
@@ -0,0 +1,39 @@
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different users concurrently, and those of one user one at a time.
+
+    An update takes its user's lock before one of the `max_concurrent_updates`
+    slots, so updates waiting for their own user don't hold slots other users
+    need. The lock comes from the state backend and also excludes other
+    worker processes; with the "memory" backend waiters are served in arrival
+    order, with Redis only one at a time but in no particular order.
+    """
+
+    def __init__(self, max_concurrent_updates, backend):
+        super().__init__(max_concurrent_updates)
+        self._backend = backend
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def process_update(self, update, coroutine):
+        # Replaces the base class' version, which takes a slot before do_process_update.
+        # Custom updates put in the queue may have no user.
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            async with self._slots:
+                await self.do_process_update(update, coroutine)
+            return
+        async with self._backend.lock(f"user:{user.id}"):
+            async with self._slots:
+                await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
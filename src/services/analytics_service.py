@@ -1,163 +1,313 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import matplotlib
 import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from src.services.translator import translate_to_russian
+from matplotlib.artist import setp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from multiprocessing import get_context
+from config.config import ANALYTICS_WORKERS, CHART_CACHE_MAX_BYTES, CHART_FILE_ID_CACHE_SIZE
+from src.utils.cache import BytesLRUCache, LRUCache
+from src.utils.metrics import metrics
 
-def create_nutrition_comparison(recipes):
+logger = logging.getLogger(__name__)
+
+# Exchange rate USD to RUB (можно обновлять при необходимости)
+USD_TO_RUB = 99.91
+HEALTH_EDGES = np.array([0, 25, 50, 75, 100])
+HEALTH_LABELS = ['0-25', '26-50', '51-75', '76-100']
+CALORIE_EDGES = np.array([0, 300, 600, 900, np.inf])
+CALORIE_LABELS = ['0-300', '301-600', '601-900', '900+']
+TOP_INGREDIENTS = 10
+
+_chart_pool = None
+
+# Rendered PNGs and their Telegram file_ids, keyed by chart type and input data
+chart_cache = BytesLRUCache(max_bytes=CHART_CACHE_MAX_BYTES)
+chart_file_ids = LRUCache(max_size=CHART_FILE_ID_CACHE_SIZE)
+
+
+class ChartImage:
+    """Rendered chart: PNG bytes, or the file_id of an earlier upload of the same image."""
+
+    def __init__(self, key, data=None, file_id=None):
+        self.key = key
+        self.data = data
+        self.file_id = file_id
+
+    @property
+    def photo(self):
+        """What to pass to send_photo: the file_id when known, otherwise the PNG itself."""
+        return self.file_id or BytesIO(self.data)
+
+def _new_figure(figsize):
+    """Figure drawn on its own Agg canvas, independent of pyplot global state."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _to_png(fig, tight_layout=False):
+    if tight_layout:
+        fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    return buf.getvalue()
+
+def create_nutrition_comparison(data):
     """Bar chart comparing calories and health scores"""
-    df = pd.DataFrame(recipes)
-    plt.figure(figsize=(10, 6))
-    x = range(len(df))
+    fig = _new_figure((10, 6))
+    ax = fig.subplots()
+    x = np.arange(len(data['calories']))
     width = 0.35
-    
-    plt.bar(x, df['calories'], width, label='Калории', color='salmon')
-    plt.bar([i + width for i in x], df['healthScore'], width, label='Полезность', color='lightgreen')
-    
-    plt.xlabel('Рецепты')
-    plt.ylabel('Значение')
-    plt.title('Сравнение калорийности и полезности рецептов')
-    plt.legend()
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    return buf
 
-def create_health_distribution(recipes):
+    ax.bar(x, data['calories'], width, label='Калории', color='salmon')
+    ax.bar(x + width, data['healthScore'], width, label='Полезность', color='lightgreen')
+
+    ax.set_xlabel('Рецепты')
+    ax.set_ylabel('Значение')
+    ax.set_title('Сравнение калорийности и полезности рецептов')
+    ax.legend()
+
+    return _to_png(fig)
+
+def create_health_distribution(data):
     """Pie chart showing health score distribution"""
-    df = pd.DataFrame(recipes)
-    plt.figure(figsize=(12, 8))
-    
-    health_bins = ['0-25', '26-50', '51-75', '76-100']
-    df['health_category'] = pd.cut(df['healthScore'], bins=[0, 25, 50, 75, 100], labels=health_bins)
-    health_dist = df['health_category'].value_counts()
-    
-    colors = plt.cm.viridis(np.linspace(0, 1, len(health_dist)))
-    wedges, texts, autotexts = plt.pie(health_dist, labels=health_dist.index, 
-                                      autopct='%1.1f%%', colors=colors,
-                                      textprops={'fontsize': 12},
-                                      pctdistance=0.85)
-    
-    # Make percentage labels white and larger
-    plt.setp(autotexts, size=14, weight="bold", color="white")
-    # Make category labels larger
-    plt.setp(texts, size=12)
-    
-    plt.title('Распределение рецептов по уровню полезности', pad=20, size=14)
-    
-    # Add legend
-    plt.legend(wedges, health_dist.index,
-              title="Уровни полезности",
-              loc="center left",
-              bbox_to_anchor=(1, 0, 0.5, 1))
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    return buf
+    fig = _new_figure((12, 8))
+    ax = fig.subplots()
+
+    # Empty categories would only stack 0% labels on top of each other
+    health_dist = [(label, count) for label, count in zip(data['labels'], data['counts']) if count]
+    labels = [label for label, _ in health_dist]
+    counts = [count for _, count in health_dist]
+
+    if counts:
+        colors = matplotlib.colormaps['viridis'](np.linspace(0, 1, len(counts)))
+        wedges, texts, autotexts = ax.pie(counts, labels=labels,
+                                          autopct='%1.1f%%', colors=colors,
+                                          textprops={'fontsize': 12},
+                                          pctdistance=0.85)
+
+        # Make percentage labels white and larger
+        setp(autotexts, size=14, weight="bold", color="white")
+        # Make category labels larger
+        setp(texts, size=12)
 
-def create_calorie_ranges(recipes):
+        # Add legend
+        ax.legend(wedges, labels,
+                  title="Уровни полезности",
+                  loc="center left",
+                  bbox_to_anchor=(1, 0, 0.5, 1))
+
+    ax.set_title('Распределение рецептов по уровню полезности', pad=20, size=14)
+
+    return _to_png(fig)
+
+def create_calorie_ranges(data):
     """Horizontal bar chart showing calorie ranges"""
-    df = pd.DataFrame(recipes)
-    plt.figure(figsize=(10, 6))
-    
-    calorie_bins = ['0-300', '301-600', '601-900', '900+']
-    df['calorie_category'] = pd.cut(df['calories'], bins=[0, 300, 600, 900, float('inf')], labels=calorie_bins)
-    calorie_dist = df['calorie_category'].value_counts()
-    
-    plt.barh(calorie_dist.index, calorie_dist.values, color='lightcoral')
-    plt.xlabel('Количество рецептов')
-    plt.ylabel('Диапазон калорий')
-    plt.title('Распределение рецептов по калорийности')
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    return buf
+    fig = _new_figure((10, 6))
+    ax = fig.subplots()
 
-def create_price_analysis(recipes):
+    ax.barh(data['labels'], data['counts'], color='lightcoral')
+    ax.set_xlabel('Количество рецептов')
+    ax.set_ylabel('Диапазон калорий')
+    ax.set_title('Распределение рецептов по калорийности')
+
+    return _to_png(fig)
+
+def create_price_analysis(data):
     """Create visualization for recipe prices"""
-    plt.figure(figsize=(12, 6))
-    
-    # Exchange rate USD to RUB (можно обновлять при необходимости)
-    usd_to_rub = 99.91
-    
-    prices = []
-    names = []
-    for recipe in recipes:
-        if 'pricePerServing' in recipe:
-            # Convert cents to rubles
-            price_in_rubles = (recipe['pricePerServing']/100) * usd_to_rub
-            prices.append(price_in_rubles)
-            names.append(recipe['title'])
-    
+    fig = _new_figure((12, 6))
+    ax = fig.subplots()
+
+    prices = data['prices']
+    names = data['titles']
+
     if prices:
-        bars = plt.bar(range(len(prices)), prices, color='teal')
-        plt.xticks(range(len(names)), names, rotation=45, ha='right')
-        
+        bars = ax.bar(range(len(prices)), prices, color='teal')
+        ax.set_xticks(range(len(names)), names, rotation=45, ha='right')
+
         # Add value labels on top of each bar
         for bar in bars:
             height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
+            ax.text(bar.get_x() + bar.get_width()/2., height,
                     f'{height:.0f}₽',
                     ha='center', va='bottom')
-    
-    plt.xlabel('Рецепты')
-    plt.ylabel('Цена за порцию (₽)')
-    plt.title('Сравнение стоимости рецептов')
-    plt.tight_layout()
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    return buf
 
+    ax.set_xlabel('Рецепты')
+    ax.set_ylabel('Цена за порцию (₽)')
+    ax.set_title('Сравнение стоимости рецептов')
 
-def create_ingredients_analysis(recipes):
+    return _to_png(fig, tight_layout=True)
+
+
+def create_ingredients_analysis(top_ingredients):
     """Analyze most common ingredients"""
-    all_ingredients = []
-    for recipe in recipes:
-        if 'extendedIngredients' in recipe:
-            ingredients = recipe['extendedIngredients']
-            # Translate each ingredient name to Russian
-            all_ingredients.extend([translate_to_russian(ing['name']) for ing in ingredients])
-    
-    if all_ingredients:
-        plt.figure(figsize=(12, 6))
-        ingredient_counts = pd.Series(all_ingredients).value_counts()
-        
-        colors = plt.cm.viridis(np.linspace(0, 1, len(ingredient_counts[:10])))
-        bars = plt.bar(range(len(ingredient_counts[:10])), ingredient_counts[:10].values, color=colors)
-        
+    fig = _new_figure((12, 6))
+    if top_ingredients:
+        ax = fig.subplots()
+        names = [name for name, _ in top_ingredients]
+        counts = [count for _, count in top_ingredients]
+
+        colors = matplotlib.colormaps['viridis'](np.linspace(0, 1, len(counts)))
+        bars = ax.bar(range(len(counts)), counts, color=colors)
+
         # Add value labels on top of each bar
         for bar in bars:
             height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
+            ax.text(bar.get_x() + bar.get_width()/2., height,
                     f'{int(height)}',
                     ha='center', va='bottom')
-        
-        plt.xticks(range(len(ingredient_counts[:10])), ingredient_counts[:10].index,
-                  rotation=45, ha='right')
-        plt.title('Топ-10 часто используемых ингредиентов')
-        plt.tight_layout()
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    return buf
 
-def generate_analytics(recipes):
+        ax.set_xticks(range(len(names)), names, rotation=45, ha='right')
+        ax.set_title('Топ-10 часто используемых ингредиентов')
+
+    return _to_png(fig, tight_layout=bool(top_ingredients))
+
+def extract_columns(recipes):
+    """Single pass turning recipe records into the NumPy columns all charts read"""
+    titles = []
+    rows = []
+    for recipe in recipes:
+        titles.append(recipe.title)
+        rows.append((recipe.calories, recipe.health_score, recipe.price_per_serving))
+    calories, health_scores, prices = np.array(rows, dtype=float).reshape(-1, 3).T
+    return {'title': titles, 'calories': calories, 'healthScore': health_scores, 'pricePerServing': prices}
+
+def bin_counts(values, edges):
+    """Counts per right-closed bin (edges[i-1], edges[i]]; the first bin includes its lower edge.
+
+    Values outside the edges are not counted.
+    """
+    indices = np.digitize(values, edges, right=True)
+    indices[values == edges[0]] = 1
+    return np.bincount(indices, minlength=len(edges) + 1)[1:len(edges)]
+
+def top_ingredients(names, k=TOP_INGREDIENTS):
+    """The k most used ingredient names with their counts"""
+    return Counter(names).most_common(k)
+
+def _translated_ingredient_names(recipes):
+    """Russian names of all ingredients used by the recipes, English ones where translation fails"""
+    # Not imported at the top: chart workers load this module and must not pull in the translator
+    from src.services.ingredient_lexicon import translate_ingredient_to_russian
+    translated = {}
+    all_ingredients = []
+    for recipe in recipes:
+        for name in recipe.ingredients:
+            if name not in translated:
+                try:
+                    translated[name] = translate_ingredient_to_russian(name)
+                except Exception as e:
+                    # One untranslated name shouldn't cost the user every chart
+                    logger.warning(f"Failed to translate ingredient {name!r}: {e}")
+                    translated[name] = name
+            all_ingredients.append(translated[name])
+    return all_ingredients
+
+def aggregate_chart_data(recipes, ingredient_names):
+    """Everything the charts draw, as plain lists: small to send to workers and exact as cache keys"""
+    columns = extract_columns(recipes)
     return {
-        'nutrition_comparison': create_nutrition_comparison(recipes),
-        'health_distribution': create_health_distribution(recipes),
-        'calorie_ranges': create_calorie_ranges(recipes),
-        'price_analysis': create_price_analysis(recipes),
-        'ingredients_analysis': create_ingredients_analysis(recipes)
+        'nutrition_comparison': {'calories': columns['calories'].tolist(),
+                                 'healthScore': columns['healthScore'].tolist()},
+        'health_distribution': {'labels': HEALTH_LABELS,
+                                'counts': bin_counts(columns['healthScore'], HEALTH_EDGES).tolist()},
+        'calorie_ranges': {'labels': CALORIE_LABELS,
+                           'counts': bin_counts(columns['calories'], CALORIE_EDGES).tolist()},
+        'price_analysis': {'titles': columns['title'],
+                           'prices': (columns['pricePerServing'] / 100 * USD_TO_RUB).tolist()},
+        'ingredients_analysis': top_ingredients(ingredient_names)
     }
+
+def _chart_key(name, data):
+    payload = json.dumps([name, data], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _warm_up():
+    """Pay the matplotlib import and font cache cost in a worker ahead of the first request"""
+    fig = _new_figure((1, 1))
+    fig.subplots().set_title('Прогрев')
+    _to_png(fig)
+
+def _get_chart_pool():
+    global _chart_pool
+    if _chart_pool is None:
+        # spawn: forking a process that runs an event loop and HTTP pools isn't safe
+        _chart_pool = ProcessPoolExecutor(max_workers=ANALYTICS_WORKERS, mp_context=get_context('spawn'))
+    return _chart_pool
+
+def warm_up_chart_pool():
+    """Start chart workers in the background, one warm-up task per worker; returns their futures."""
+    pool = _get_chart_pool()
+    return [pool.submit(_warm_up) for _ in range(ANALYTICS_WORKERS)]
+
+def shutdown_chart_pool():
+    global _chart_pool
+    if _chart_pool is not None:
+        _chart_pool.shutdown(wait=False, cancel_futures=True)
+        _chart_pool = None
+
+CHART_BUILDERS = {
+    'nutrition_comparison': create_nutrition_comparison,
+    'health_distribution': create_health_distribution,
+    'calorie_ranges': create_calorie_ranges,
+    'price_analysis': create_price_analysis,
+    'ingredients_analysis': create_ingredients_analysis
+}
+metrics.register_cache("charts", chart_cache)
+metrics.register_cache("chart_file_ids", chart_file_ids)
+
+def _render_chart(name, data):
+    """Runs in a worker: the PNG and the seconds it took, recorded by the parent's metrics"""
+    started = time.perf_counter()
+    image = CHART_BUILDERS[name](data)
+    return image, time.perf_counter() - started
+
+def remember_chart_file_id(chart, file_id):
+    """Store the Telegram file_id of an uploaded chart so identical charts aren't uploaded again."""
+    chart_file_ids.set(chart.key, file_id)
+
+@metrics.timed("analytics.generate")
+async def generate_analytics(recipes):
+    """Render all charts in parallel in the worker pool, reusing cached images.
+
+    Returns ChartImage objects by chart name; charts that failed to render are missing.
+    """
+    loop = asyncio.get_running_loop()
+    ingredient_names = await asyncio.to_thread(_translated_ingredient_names, recipes)
+    charts = aggregate_chart_data(recipes, ingredient_names)
+
+    results = {}
+    to_render = {}
+    for name, data in charts.items():
+        key = _chart_key(name, data)
+        file_id = chart_file_ids.get(key)
+        cached = chart_cache.get(key) if file_id is None else None
+        if file_id is not None or cached is not None:
+            results[name] = ChartImage(key, cached, file_id)
+        else:
+            to_render[name] = (key, data)
+    logger.info(f"Chart cache: {len(charts) - len(to_render)} of {len(charts)} charts reused "
+                f"({chart_cache.total_bytes} bytes cached)")
+
+    pool = _get_chart_pool()
+    rendered = await asyncio.gather(*(loop.run_in_executor(pool, _render_chart, name, data)
+                                      for name, (_, data) in to_render.items()),
+                                    return_exceptions=True)
+    for (name, (key, _)), result in zip(to_render.items(), rendered):
+        if isinstance(result, Exception):
+            metrics.observe(f"analytics.{CHART_BUILDERS[name].__name__}", 0.0, error=True)
+            logger.error(f"Failed to render chart {name}: {result!r}")
+            continue
+        image, seconds = result
+        metrics.observe(f"analytics.{CHART_BUILDERS[name].__name__}", seconds)
+        chart_cache.set(key, image)
+        results[name] = ChartImage(key, image)
+    # Charts that failed to render are left out
+    return {name: results[name] for name in charts if name in results}
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import re
+import threading
+from config.config import INGREDIENT_LEXICON_LEARNED_PATH
+from src.services.translator import translate
+from src.utils.cache import SQLiteStore
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'ingredients.json')
+
+# Noun and adjective endings, longest first, stripped to match Russian word forms
+RUSSIAN_ENDINGS = sorted((
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ов", "ев",
+    "ам", "ям", "ах", "ях", "ом", "ем", "ую", "юю",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+_WORD_PATTERN = re.compile(r"[a-zа-я]+")
+_CYRILLIC_PATTERN = re.compile(r"[а-яё]", re.IGNORECASE)
+
+
+def _stem_russian(word):
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+def _singularize_english(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+def normalize_russian(name):
+    """Lookup key for a Russian ingredient name, shared by its case and number forms."""
+    words = _WORD_PATTERN.findall(name.lower().replace("ё", "е"))
+    return " ".join(_stem_russian(word) for word in words)
+
+def normalize_english(name):
+    """Lookup key for an English ingredient name, shared by its singular and plural."""
+    return " ".join(_singularize_english(word) for word in _WORD_PATTERN.findall(name.lower()))
+
+
+class IngredientLexicon:
+    """Bilingual ingredient dictionary consulted before the online translator.
+
+    The bundled word list is loaded on first use. Names it doesn't know are
+    translated online once and remembered in a persistent store.
+    """
+
+    def __init__(self, path, learned_store):
+        self.path = path
+        self.learned = learned_store
+        self.hits = 0
+        self.misses = 0
+        self._ru_to_en = None
+        self._en_to_ru = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._ru_to_en is not None:
+                return
+            with open(self.path, encoding='utf-8') as f:
+                pairs = json.load(f)
+            ru_to_en, en_to_ru = {}, {}
+            for russian, english in pairs:
+                ru_to_en.setdefault(normalize_russian(russian), english)
+                en_to_ru.setdefault(normalize_english(english), russian)
+            self._ru_to_en, self._en_to_ru = ru_to_en, en_to_ru
+            logger.info(f"Ingredient lexicon loaded: {len(pairs)} entries")
+
+    def to_english(self, name):
+        """Translate a Russian ingredient name; English input is returned as is."""
+        name = name.strip()
+        if not name or not _CYRILLIC_PATTERN.search(name):
+            return name
+        return self._lookup(name, 'ru', 'en', normalize_russian(name), normalize_english)
+
+    def to_russian(self, name):
+        """Translate an English ingredient name to Russian."""
+        name = name.strip()
+        if not name:
+            return ""
+        return self._lookup(name, 'en', 'ru', normalize_english(name), normalize_russian)
+
+    def _lookup(self, name, source, target, key, normalize_target):
+        if self._ru_to_en is None:
+            self._load()
+        bundled = self._ru_to_en if source == 'ru' else self._en_to_ru
+        translated = bundled.get(key) or self.learned.get(f"{source}:{key}")
+        if translated is not None:
+            self.hits += 1
+            return translated
+
+        self.misses += 1
+        translated = translate(name, source, target)
+        # Remember both directions so the lexicon grows with every miss
+        self.learned.set(f"{source}:{key}", translated)
+        self.learned.set(f"{target}:{normalize_target(translated)}", name)
+        return translated
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+ingredient_lexicon = IngredientLexicon(
+    LEXICON_PATH,
+    SQLiteStore(INGREDIENT_LEXICON_LEARNED_PATH, table="ingredients")
+)
+metrics.register_cache("ingredient_lexicon", ingredient_lexicon)
+
+@metrics.timed("ingredients.to_english")
+def translate_ingredients_to_english(names):
+    """Translate user-typed ingredient names to English for the recipe search."""
+    translated = [ingredient_lexicon.to_english(name) for name in names]
+    logger.info(f"Ingredient lexicon hit rate: {ingredient_lexicon.hit_ratio:.0%} "
+                f"({ingredient_lexicon.hits} hits, {ingredient_lexicon.misses} misses)")
+    return translated
+
+def translate_ingredient_to_russian(name):
+    """Translate a Spoonacular ingredient name to Russian."""
+    return ingredient_lexicon.to_russian(name)
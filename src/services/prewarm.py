@@ -0,0 +1,115 @@
+import logging
+from config.config import (RECIPES_PER_SEARCH, PREWARM_INTERVAL, PREWARM_TOP_QUERIES, PREWARM_QUOTA_HEADROOM,
+                           PREWARM_ANALYTICS, QUERY_LOG_MAX_SIZE, QUERY_LOG_DECAY)
+from src.services.recipe_service import refresh_recipes, ensure_summaries, get_recipe_instructions
+from src.services.recipe_store import recipe_store
+from src.services.search_cache import normalize_ingredients
+from src.services.upstream_scheduler import (BACKGROUND, SPOONACULAR, QuotaExceededError, upstream_context,
+                                             upstream_scheduler)
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Strict and flexible search, as offered by the search type buttons
+RANKINGS = (1, 2)
+# Counts that decayed below this are forgotten
+MIN_COUNT = 0.5
+
+
+class QueryLog:
+    """How often each normalized ingredient query was searched, recent searches weighing more.
+
+    Counts are decayed after every prewarm run; when more than `max_size`
+    queries are counted, the rarest half is dropped.
+    """
+
+    def __init__(self, max_size=10000, decay_factor=0.5):
+        self.max_size = max_size
+        self.decay_factor = decay_factor
+        self._counts = {}
+
+    def record(self, ingredients):
+        query = normalize_ingredients(ingredients)
+        if not query:
+            return
+        self._counts[query] = self._counts.get(query, 0) + 1
+        if len(self._counts) > self.max_size:
+            kept = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:self.max_size // 2]
+            self._counts = dict(kept)
+
+    def top(self, k):
+        """The `k` most frequent queries, as ingredient tuples."""
+        return [query for query, _ in sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:k]]
+
+    def decay(self):
+        self._counts = {query: count * self.decay_factor for query, count in self._counts.items()
+                        if count * self.decay_factor >= MIN_COUNT}
+
+    def __len__(self):
+        return len(self._counts)
+
+
+query_log = QueryLog(max_size=QUERY_LOG_MAX_SIZE, decay_factor=QUERY_LOG_DECAY)
+metrics.register_gauge("query_log_size", "Distinct ingredient queries counted for prewarming",
+                       lambda: len(query_log))
+
+
+def has_spare_quota():
+    """Whether background calls may spend Spoonacular quota now, with no user waiting for a call."""
+    if upstream_scheduler.queued(SPOONACULAR):
+        return False
+    quota = upstream_scheduler.quota(SPOONACULAR)
+    try:
+        quota.check(BACKGROUND)
+    except QuotaExceededError:
+        return False
+    return quota.left is None or quota.left - quota.reserve >= PREWARM_QUOTA_HEADROOM
+
+
+@metrics.timed("prewarm.search")
+async def prewarm_search(ingredients, ranking):
+    """Refresh a search and translate everything its results may show: summaries, instructions, charts."""
+    # Results still fresh at the next run are kept as they are
+    recipes = await refresh_recipes(list(ingredients), number=RECIPES_PER_SEARCH, ranking=ranking,
+                                    min_fresh=PREWARM_INTERVAL or 0)
+    records = [recipe_store.add(recipe) for recipe in recipes]
+    await ensure_summaries(records)
+    for record in records:
+        await get_recipe_instructions(record)
+    if PREWARM_ANALYTICS and records:
+        # Loaded here rather than at import, like in the analytics button handler
+        from src.services.analytics_service import generate_analytics
+        await generate_analytics(records)
+    return len(records)
+
+
+@metrics.timed("prewarm.run")
+async def prewarm_popular_searches(k=PREWARM_TOP_QUERIES):
+    """Keep the `k` most frequent searches warm, while Spoonacular quota is to spare.
+
+    Calls run at background priority, behind every user request.
+    """
+    queries = query_log.top(k)
+    warmed = 0
+    try:
+        with upstream_context(user_id=None, priority=BACKGROUND):
+            for ingredients in queries:
+                for ranking in RANKINGS:
+                    if not has_spare_quota():
+                        logger.info(f"Prewarming paused after {warmed} searches, no spare Spoonacular quota")
+                        return warmed
+                    try:
+                        await prewarm_search(ingredients, ranking)
+                    except QuotaExceededError:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Prewarming {', '.join(ingredients)} (ranking {ranking}) failed: {e}")
+                        continue
+                    warmed += 1
+    except QuotaExceededError as e:
+        logger.info(f"Prewarming stopped after {warmed} searches: {e}")
+        return warmed
+    finally:
+        query_log.decay()
+    logger.info(f"Prewarmed {warmed} searches of {len(queries)} popular queries")
+    return warmed
@@ -0,0 +1,173 @@
+import json
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from config.config import RECIPE_INDEX_PATH, RECIPE_INDEX_MAX_ENTRIES
+from src.services.ingredient_lexicon import normalize_english
+from src.utils.cache import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+def _ingredient_names(ingredient):
+    """Normalized names an extendedIngredients entry is known by."""
+    names = {normalize_english(ingredient.get(field) or "") for field in ('name', 'nameClean')}
+    names.discard("")
+    return sorted(names)
+
+def _match_keys(names):
+    """Search terms matching an ingredient: its full names and each of their words."""
+    return frozenset(names).union(*(name.split() for name in names))
+
+
+class IndexedRecipe:
+    """What a local search needs to know about a recipe."""
+
+    __slots__ = ('id', 'title', 'image', 'ingredients')
+
+    def __init__(self, id, title, image, ingredients):
+        self.id = id
+        self.title = title
+        self.image = image
+        # Match keys per distinct ingredient
+        self.ingredients = ingredients
+
+
+class RecipeIndex:
+    """Inverted index from normalized ingredient names to recipe IDs.
+
+    Answers findByIngredients-style searches from recipes seen before.
+    Indexed recipes are persisted in `store` and loaded on first use. Like
+    the store, the index keeps the `max_entries` most recently indexed
+    recipes, by default as many as the store does.
+    """
+
+    def __init__(self, store, max_entries=None):
+        self.store = store
+        self.max_entries = max_entries if max_entries is not None else store.max_entries
+        # Recipe ID -> IndexedRecipe, least recently indexed first
+        self._recipes = None
+        # Match key -> sorted array of recipe IDs
+        self._postings = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._recipes is not None:
+                return
+            self._recipes, self._postings = OrderedDict(), {}
+            entries = self.store.items()
+            for _, entry in entries:
+                self._insert(entry)
+            logger.info(f"Recipe index loaded: {len(self._recipes)} recipes, "
+                         f"{len(self._postings)} ingredient keys")
+
+    def add_many(self, recipes):
+        """Index Spoonacular recipe details (anything with id, title and extendedIngredients)."""
+        if self._recipes is None:
+            self._load()
+        for details in recipes:
+            if 'id' not in details or not details.get('extendedIngredients'):
+                continue
+            ingredients = {}
+            for ingredient in details['extendedIngredients']:
+                names = _ingredient_names(ingredient)
+                if names:
+                    # The same ingredient can be listed twice, e.g. lemon juice
+                    ingredients.setdefault(ingredient.get('id') or names[0], names)
+            entry = {"id": details['id'], "title": details.get('title', ""), "image": details.get('image'),
+                     "ingredients": list(ingredients.values())}
+            with self._lock:
+                self._insert(entry)
+            self.store.set(str(details['id']), entry)
+
+    def add(self, details):
+        self.add_many([details])
+
+    def load_dump(self, path):
+        """Index a JSON dump of recipe details, either one recipe or a list of them."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        recipes = data if isinstance(data, list) else [data]
+        self.add_many(recipes)
+        return recipes
+
+    def _insert(self, entry):
+        recipe_id = entry['id']
+        previous = self._recipes.pop(recipe_id, None)
+        if previous is not None:
+            self._remove_postings(previous)
+        ingredients = tuple(_match_keys(names) for names in entry['ingredients'])
+        self._recipes[recipe_id] = IndexedRecipe(recipe_id, entry['title'], entry['image'], ingredients)
+        for key in frozenset().union(*ingredients):
+            self._add_posting(key, recipe_id)
+        while self.max_entries and len(self._recipes) > self.max_entries:
+            _, evicted = self._recipes.popitem(last=False)
+            self._remove_postings(evicted)
+
+    def _remove_postings(self, recipe):
+        for key in frozenset().union(*recipe.ingredients):
+            self._remove_posting(key, recipe.id)
+
+    def _add_posting(self, key, recipe_id):
+        postings = self._postings.setdefault(key, array('q'))
+        i = bisect_left(postings, recipe_id)
+        if i == len(postings) or postings[i] != recipe_id:
+            postings.insert(i, recipe_id)
+
+    def _remove_posting(self, key, recipe_id):
+        postings = self._postings.get(key)
+        if postings is None:
+            return
+        i = bisect_left(postings, recipe_id)
+        if i < len(postings) and postings[i] == recipe_id:
+            del postings[i]
+            if not postings:
+                del self._postings[key]
+
+    def search(self, ingredients, number, ranking=1):
+        """Best local matches for the ingredients and how well they cover the search.
+
+        ranking=1 maximizes used ingredients, ranking=2 minimizes missing
+        ones, like findByIngredients. Results are shaped like its response.
+        Coverage is the share of the requested ingredient slots the results
+        fill: `number` results each using every ingredient give 1.0.
+        """
+        if self._recipes is None:
+            self._load()
+        terms = {normalize_english(ingredient) for ingredient in ingredients} - {""}
+        if not terms or number <= 0:
+            return [], 0.0
+
+        with self._lock:
+            used = Counter()
+            for term in terms:
+                used.update(self._postings.get(term, ()))
+            matches = []
+            for recipe_id, used_count in used.items():
+                recipe = self._recipes[recipe_id]
+                missed_count = sum(1 for keys in recipe.ingredients if keys.isdisjoint(terms))
+                matches.append((recipe, used_count, missed_count))
+
+        if ranking == 2:
+            matches.sort(key=lambda match: (match[2], -match[1], match[0].id))
+        else:
+            matches.sort(key=lambda match: (-match[1], match[2], match[0].id))
+        matches = matches[:number]
+
+        coverage = sum(used_count for _, used_count, _ in matches) / (len(terms) * number)
+        results = [{"id": recipe.id, "title": recipe.title, "image": recipe.image,
+                    "usedIngredientCount": used_count, "missedIngredientCount": missed_count}
+                   for recipe, used_count, missed_count in matches]
+        return results, coverage
+
+    def __len__(self):
+        if self._recipes is None:
+            self._load()
+        return len(self._recipes)
+
+
+recipe_index = RecipeIndex(SQLiteStore(RECIPE_INDEX_PATH, table="recipe_index",
+                                       max_entries=RECIPE_INDEX_MAX_ENTRIES))
@@ -1,83 +1,297 @@
-import requests
+import asyncio
 import logging
-from config.config import SPOONACULAR_API_KEY
-from src.services.translator import translate_to_russian, clean_and_translate_instructions, clean_and_translate_summary
+from config.config import (SPOONACULAR_API_KEY, SPOONACULAR_TIMEOUT,
+                           SPOONACULAR_MAX_CONCURRENCY, SPOONACULAR_RETRIES,
+                           SPOONACULAR_BULK_CHUNK_SIZE, RECIPE_CACHE_PATH, RECIPE_CACHE_TTL,
+                           RECIPE_CACHE_MAX_ENTRIES, RECIPE_CACHE_MEMORY_SIZE,
+                           SEARCH_CACHE_MAX_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL,
+                           LAZY_ENRICHMENT, RECIPE_INDEX_MIN_COVERAGE)
+from src.services.recipe_index import recipe_index
+from src.services.search_cache import SearchCache, search_key
+from src.services.spoonacular_client import SpoonacularClient
+from src.services.upstream_scheduler import QuotaExceededError, upstream_scheduler
+from src.utils.cache import SQLiteStore, TieredCache
+from src.utils.metrics import metrics
+from src.services.translator import (translate_batch, translate_recipe_texts, clean_and_translate_instructions,
+                                     clean_and_translate_summaries)
 
 logger = logging.getLogger(__name__)
 
-def get_recipes(ingredients, number=2, ranking=1):
+spoonacular_client = SpoonacularClient(
+    SPOONACULAR_API_KEY,
+    timeout=SPOONACULAR_TIMEOUT,
+    max_concurrency=SPOONACULAR_MAX_CONCURRENCY,
+    retries=SPOONACULAR_RETRIES,
+    bulk_chunk_size=SPOONACULAR_BULK_CHUNK_SIZE,
+    scheduler=upstream_scheduler
+)
+
+# Raw details and the translated recipe dict per recipe ID, persisted across restarts
+recipe_cache = TieredCache(
+    SQLiteStore(RECIPE_CACHE_PATH, table="recipes", ttl=RECIPE_CACHE_TTL,
+                max_entries=RECIPE_CACHE_MAX_ENTRIES),
+    memory_size=RECIPE_CACHE_MEMORY_SIZE
+)
+
+# Translated search results keyed by the canonical ingredient set, ranking and number
+search_cache = SearchCache(max_size=SEARCH_CACHE_MAX_SIZE, ttl=SEARCH_CACHE_TTL,
+                           stale_ttl=SEARCH_CACHE_STALE_TTL)
+metrics.register_cache("recipes", recipe_cache)
+metrics.register_cache("searches", search_cache)
+
+async def refresh_recipes(ingredients, number=2, ranking=1, min_fresh=0):
+    """Search results for prewarming: the cached ones, unless they go stale within `min_fresh` seconds.
+
+    Otherwise the search is run again and cached; raises QuotaExceededError
+    like iter_recipes.
+    """
+    key = search_key(ingredients, number, ranking)
+    fetch = lambda: _search_recipes(list(key[0]), number, ranking)
+    fresh_for = search_cache.fresh_for(key)
+    if fresh_for is not None and fresh_for > min_fresh:
+        return search_cache.get_cached(key, fetch)
+    return await search_cache.refresh(key, fetch)
+
+async def iter_recipes(ingredients, number=2, ranking=1):
+    """Yield translated recipes one by one, as soon as each of them is ready.
+
+    Cached searches are yielded at once; otherwise recipes come in completion
+    order and the full result is cached when the search finishes. Raises
+    QuotaExceededError when Spoonacular can't be asked today.
+    """
+    key = search_key(ingredients, number, ranking)
+    cached = search_cache.get_cached(key, lambda: _search_recipes(list(key[0]), number, ranking))
+    if cached is not None:
+        for recipe in cached:
+            yield recipe
+        return
+
+    # Users running the same search at once share one upstream search
+    try:
+        async for recipe in search_cache.stream(key, lambda: _stream_recipes(list(key[0]), number, ranking)):
+            yield recipe
+    except QuotaExceededError:
+        raise
+    except Exception as e:
+        logger.info(f"Error fetching recipes: {e}")
+
+async def _search_recipes(ingredients, number, ranking):
     try:
-        base_recipes = _get_base_recipes(ingredients, number, ranking)
-        logger.info(f"Base recipes found: {len(base_recipes)}")
-        detailed_recipes = _enrich_recipes_with_details(base_recipes)
-        logger.info(f"Detailed recipes processed: {len(detailed_recipes)}")
-        return detailed_recipes
+        results = [result async for result in _stream_recipes(ingredients, number, ranking)]
+        # Keep Spoonacular's ranking order rather than completion order
+        return [recipe for _, recipe in sorted(results, key=lambda result: result[0])]
+    except QuotaExceededError:
+        raise
     except Exception as e:
         logger.info(f"Error fetching recipes: {e}")
         return []
 
-def _get_base_recipes(ingredients, number, ranking):
-    ingredients_str = ",".join([ingredient.strip() for ingredient in ingredients])
-    url = f"https://api.spoonacular.com/recipes/findByIngredients"
-    params = {
-        "ingredients": ingredients_str,
-        "number": number,
-        "apiKey": SPOONACULAR_API_KEY,
-        "ranking": ranking,
-        "ignorePantry": False,
-        "limitLicense": True
-    }
-    
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
+async def _stream_recipes(ingredients, number, ranking):
+    """Search and enrich recipes, yielding (rank position, recipe) pairs as they finish."""
+    base_recipes = await _find_recipes(ingredients, number, ranking)
+    logger.info(f"Base recipes found: {len(base_recipes)}")
+    positions = {recipe['id']: i for i, recipe in enumerate(base_recipes)}
+    processed = 0
+    async for recipe in _enrich_recipes_with_details(base_recipes):
+        processed += 1
+        yield positions[recipe['id']], recipe
+    logger.info(f"Detailed recipes processed: {processed}")
+
+@metrics.timed("search.base_recipes")
+async def _find_recipes(ingredients, number, ranking):
+    """Search the local recipe index, falling back to Spoonacular when it covers too little."""
+    local_recipes, coverage = await asyncio.to_thread(recipe_index.search, ingredients, number, ranking)
+    if coverage >= RECIPE_INDEX_MIN_COVERAGE:
+        logger.info(f"Answered search from the local index (coverage {coverage:.0%})")
+        return local_recipes
+    logger.info(f"Local index coverage {coverage:.0%} is below {RECIPE_INDEX_MIN_COVERAGE:.0%}, "
+                f"searching Spoonacular")
+    try:
+        return await spoonacular_client.find_by_ingredients(ingredients, number, ranking)
+    except QuotaExceededError:
+        if not local_recipes:
+            raise
+        # Weaker local matches beat no answer at all
+        logger.warning(f"Spoonacular quota exhausted, answering with {len(local_recipes)} local matches")
+        return local_recipes
 
-def _enrich_recipes_with_details(base_recipes):
-    detailed_recipes = []
+def load_recipe_dump(path):
+    """Index a JSON dump of recipe details and keep the details for enrichment."""
+    recipes = recipe_index.load_dump(path)
+    for details in recipes:
+        key = _recipe_cache_key(details['id'])
+        if recipe_cache.get(key) is None:
+            # Translated lazily, the first time a search returns the recipe
+            recipe_cache.set(key, {"details": details, "recipe": None})
+    logger.info(f"Indexed {len(recipes)} recipes from {path}")
+    return len(recipes)
+
+async def close_client():
+    """Close pooled Spoonacular connections."""
+    await spoonacular_client.aclose()
+
+async def _enrich_recipes_with_details(base_recipes):
+    """Yield translated recipes: cached ones first, then the rest as their translation finishes."""
+    missing = []
+    # Details known without a translated recipe, e.g. loaded from a dump
+    known_details = {}
     for recipe in base_recipes:
-        details = _get_recipe_details(recipe['id'])
-        
-        # Get instructions from either regular instructions or analyzedInstructions
-        instructions = details.get('instructions')
-        if not instructions:
-            analyzed = details.get('analyzedInstructions', [])
-            if analyzed:
-                steps = analyzed[0].get('steps', [])
-                instructions = "\n".join([f"Шаг {i+1}: {step['step']}" for i, step in enumerate(steps)])
-        
-        translated_instructions = clean_and_translate_instructions(instructions)
-        
-        detailed_recipes.append({
-            "title": translate_to_russian(recipe.get("title")),
-            "id": recipe.get("id"),
-            "url": details.get("spoonacularSourceUrl"),
-            "image": recipe.get("image"),
-            "calories": _extract_calories(details),
-            "healthScore": details.get('healthScore', 0),
-            "summary": clean_and_translate_summary(details.get('summary')),
-            "instructions": translated_instructions,
-            "pricePerServing": details.get('pricePerServing', 0),
-            "extendedIngredients": details.get('extendedIngredients', [])
-        })
-    
-    return detailed_recipes
-
-
-def _get_recipe_details(recipe_id):
-    """Fetch detailed information for a specific recipe."""
-    details_url = f"https://api.spoonacular.com/recipes/{recipe_id}/information"
-    details_params = {
-        "apiKey": SPOONACULAR_API_KEY,
-        "includeNutrition": True
+        entry = await asyncio.to_thread(recipe_cache.get, _recipe_cache_key(recipe['id']))
+        if entry is not None and entry['recipe'] is not None:
+            yield entry['recipe']
+        else:
+            missing.append(recipe)
+            if entry is not None:
+                known_details[recipe['id']] = entry['details']
+    logger.info(f"Recipe cache: {len(base_recipes) - len(missing)} hits, {len(missing)} misses "
+                f"(hit ratio {recipe_cache.hit_ratio:.0%})")
+
+    if missing:
+        async for recipe in _fetch_and_translate(missing, known_details):
+            yield recipe
+
+@metrics.timed("search.fetch_and_translate")
+async def _fetch_and_translate(base_recipes, known_details=None):
+    """Fetch, translate and cache recipes that are not cached yet, yielding each when done."""
+    details_by_id = dict(known_details or {})
+    to_fetch = [recipe['id'] for recipe in base_recipes if recipe['id'] not in details_by_id]
+    if to_fetch:
+        fetched, stats = await spoonacular_client.get_recipe_details_bulk(to_fetch)
+        logger.info(f"Bulk enrichment saved {stats.saved_round_trips} round trips "
+                    f"and {stats.saved_quota_points:g} quota points "
+                    f"(total saved: {spoonacular_client.bulk_stats.saved_round_trips} round trips, "
+                    f"{spoonacular_client.bulk_stats.saved_quota_points:g} points)")
+        # Every fetched recipe makes the local index answer more searches
+        await asyncio.to_thread(recipe_index.add_many, list(fetched.values()))
+        details_by_id.update(fetched)
+
+    if LAZY_ENRICHMENT:
+        # Cards only need translated titles: one batch for the whole search
+        found = [recipe for recipe in base_recipes if recipe['id'] in details_by_id]
+        titles = await asyncio.to_thread(translate_batch, [recipe.get("title") for recipe in found])
+        for recipe, title in zip(found, titles):
+            details = details_by_id[recipe['id']]
+            card = _build_card(recipe, details, title)
+            await asyncio.to_thread(_cache_recipe, recipe['id'], details, card)
+            yield card
+        return
+
+    # Translation is blocking network I/O, so run it off the event loop
+    tasks = [asyncio.ensure_future(asyncio.to_thread(_build_and_cache_recipe, recipe, details_by_id[recipe['id']]))
+             for recipe in base_recipes if recipe['id'] in details_by_id]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _recipe_cache_key(recipe_id):
+    return str(recipe_id)
+
+def _cache_recipe(recipe_id, details, recipe):
+    recipe_cache.set(_recipe_cache_key(recipe_id), {"details": details, "recipe": recipe})
+
+def _build_and_cache_recipe(recipe, details):
+    detailed_recipe = _build_recipe(recipe, details)
+    _cache_recipe(recipe['id'], details, detailed_recipe)
+    return detailed_recipe
+
+def _build_card(recipe, details, title):
+    """Recipe dict with what result cards need; summary and instructions are left to translate on demand."""
+    return {
+        "title": title,
+        "id": recipe.get("id"),
+        "url": details.get("spoonacularSourceUrl"),
+        "image": recipe.get("image"),
+        "calories": _extract_calories(details),
+        "healthScore": details.get('healthScore', 0),
+        "summary": None,
+        "instructions": None,
+        "pricePerServing": details.get('pricePerServing', 0),
+        "extendedIngredients": details.get('extendedIngredients', [])
     }
-    response = requests.get(details_url, params=details_params)
-    details = response.json()
-    
-    # logger.info(f"Recipe {recipe_id} instructions present: {bool(details.get('instructions'))}")
-    # logger.info(f"Raw instructions data: {details.get('instructions')}")
-    
+
+def _build_recipe(recipe, details):
+    """Combine a search result with its details into a fully translated recipe dict."""
+    title, summary, translated_instructions = translate_recipe_texts(
+        recipe.get("title"), details.get('summary'), _extract_instructions(details))
+
+    detailed_recipe = _build_card(recipe, details, title)
+    detailed_recipe.update(summary=summary, instructions=translated_instructions)
+    return detailed_recipe
+
+def _extract_instructions(details):
+    """Get instructions from either regular instructions or analyzedInstructions."""
+    instructions = details.get('instructions')
+    if not instructions:
+        analyzed = details.get('analyzedInstructions', [])
+        if analyzed:
+            steps = analyzed[0].get('steps', [])
+            instructions = "\n".join([f"Шаг {i+1}: {step['step']}" for i, step in enumerate(steps)])
+    return instructions
+
+@metrics.timed("recipe.ensure_summaries")
+async def ensure_summaries(recipes):
+    """Translate the summaries of recipe records about to be shown, in one batch.
+
+    Summaries are memoized on the records and in the recipe cache. Records
+    whose details or translation fail keep no summary, so their cards are
+    shown without one; QuotaExceededError is raised.
+    """
+    pending = []
+    details = []
+    for recipe in recipes:
+        if recipe.summary is not None:
+            continue
+        try:
+            details.append(await _get_details(recipe.id))
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            logger.warning(f"No details for the summary of recipe {recipe.id}: {e}")
+            continue
+        pending.append(recipe)
+    if not pending:
+        return
+    try:
+        summaries = await asyncio.to_thread(clean_and_translate_summaries,
+                                            [recipe_details.get('summary') for recipe_details in details])
+    except Exception as e:
+        logger.warning(f"Failed to translate {len(pending)} summaries: {e}")
+        return
+    for recipe, summary in zip(pending, summaries):
+        recipe.summary = summary
+        await asyncio.to_thread(_memoize_field, recipe.id, 'summary', summary)
+
+@metrics.timed("recipe.instructions")
+async def get_recipe_instructions(recipe):
+    """Translated instructions of a recipe record, translated on first request and memoized."""
+    if recipe.instructions is None:
+        details = await _get_details(recipe.id)
+        recipe.instructions = await asyncio.to_thread(clean_and_translate_instructions,
+                                                      _extract_instructions(details))
+        await asyncio.to_thread(_memoize_field, recipe.id, 'instructions', recipe.instructions)
+    return recipe.instructions
+
+@metrics.timed("recipe.details")
+async def _get_details(recipe_id):
+    """Raw Spoonacular details, from the recipe cache when possible."""
+    entry = await asyncio.to_thread(recipe_cache.get, _recipe_cache_key(recipe_id))
+    if entry is not None:
+        return entry['details']
+    details = await spoonacular_client.get_recipe_details(recipe_id)
+    # Evicted or expired: keep the details so the next button press doesn't fetch them again
+    await asyncio.to_thread(recipe_cache.set, _recipe_cache_key(recipe_id), {"details": details, "recipe": None})
     return details
 
+def _memoize_field(recipe_id, field, value):
+    key = _recipe_cache_key(recipe_id)
+    entry = recipe_cache.get(key)
+    if entry is not None and entry['recipe'] is not None:
+        entry['recipe'][field] = value
+        recipe_cache.set(key, entry)
+
 def _extract_calories(details):
     """Extract calorie information from recipe details."""
     return next((nutrient['amount'] 
@@ -0,0 +1,138 @@
+import asyncio
+import sys
+from array import array
+from config.config import RECIPE_STORE_SIZE, SESSION_IDLE_TTL
+from src.services.recipe_service import recipe_cache
+from src.services.state_backend import state_backend
+from src.utils.cache import LRUCache
+
+
+class RecipeRecord:
+    """Compact recipe shared by every session that found it."""
+
+    __slots__ = ('id', 'title', 'url', 'image', 'calories', 'health_score', 'price_per_serving',
+                 'summary', 'instructions', 'ingredients')
+
+    def __init__(self, id, title, url, image, calories, health_score, price_per_serving,
+                 summary, instructions, ingredients):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.image = image
+        self.calories = calories
+        self.health_score = health_score
+        self.price_per_serving = price_per_serving
+        self.summary = summary
+        self.instructions = instructions
+        # Ingredient names only, interned since the same names repeat across recipes
+        self.ingredients = ingredients
+
+    @classmethod
+    def from_dict(cls, recipe):
+        """Build a record from a recipe dict produced by recipe_service."""
+        return cls(
+            id=recipe['id'],
+            title=recipe['title'],
+            url=recipe.get('url'),
+            image=recipe.get('image'),
+            calories=recipe.get('calories', 0),
+            health_score=recipe.get('healthScore', 0),
+            price_per_serving=recipe.get('pricePerServing', 0),
+            summary=recipe.get('summary'),
+            instructions=recipe.get('instructions'),
+            ingredients=tuple(sys.intern(ingredient['name'])
+                              for ingredient in recipe.get('extendedIngredients', []))
+        )
+
+
+class RecipeStore:
+    """Deduplicated recipe records keyed by ID.
+
+    Records evicted from memory are rebuilt from the persistent recipe
+    cache, read in a worker thread.
+    """
+
+    def __init__(self, max_size):
+        self._records = LRUCache(max_size=max_size)
+
+    def add(self, recipe):
+        """Store a recipe dict, returning the record shared by all sessions."""
+        record = self._records.get(recipe['id'])
+        if record is None:
+            record = RecipeRecord.from_dict(recipe)
+            self._records.set(record.id, record)
+        else:
+            # Keep texts another copy of the recipe already has translated
+            record.summary = record.summary or recipe.get('summary')
+            record.instructions = record.instructions or recipe.get('instructions')
+        return record
+
+    async def get(self, recipe_id):
+        records = await self.get_many([recipe_id])
+        return records[0] if records else None
+
+    async def get_many(self, recipe_ids):
+        records = {recipe_id: self._records.get(recipe_id) for recipe_id in recipe_ids}
+        missing = [recipe_id for recipe_id, record in records.items() if record is None]
+        if missing:
+            records.update(await asyncio.to_thread(self._load, missing))
+        return [records[recipe_id] for recipe_id in recipe_ids if records[recipe_id] is not None]
+
+    def _load(self, recipe_ids):
+        """Records rebuilt from the recipe cache, keyed by ID."""
+        records = {}
+        for recipe_id in recipe_ids:
+            entry = recipe_cache.get(str(recipe_id))
+            if entry is not None and entry['recipe'] is not None:
+                records[recipe_id] = RecipeRecord.from_dict(entry['recipe'])
+                self._records.set(recipe_id, records[recipe_id])
+        return records
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SessionStore:
+    """Per-user state kept in a state backend, dropped after `idle_ttl` seconds of inactivity.
+
+    Holds the ordered recipe IDs of the user's last search and the
+    ingredients they typed. Callers serialize a user's updates, so the
+    read-modify-write in append needs no extra locking.
+    """
+
+    def __init__(self, backend, idle_ttl):
+        self._backend = backend
+        self._idle_ttl = idle_ttl
+
+    async def start(self, user_id):
+        """Start a new search for the user, forgetting the previous results."""
+        await self._backend.set(f"session:{user_id}", array('q'), ttl=self._idle_ttl)
+
+    async def append(self, user_id, recipe_id):
+        recipe_ids = await self._backend.get(f"session:{user_id}")
+        if recipe_ids is None:
+            recipe_ids = array('q')
+        recipe_ids.append(recipe_id)
+        await self._backend.set(f"session:{user_id}", recipe_ids, ttl=self._idle_ttl)
+
+    async def get_recipe_ids(self, user_id):
+        recipe_ids = await self._backend.get(f"session:{user_id}")
+        if recipe_ids is None:
+            return []
+        # Re-store to restart the idle timer
+        await self._backend.set(f"session:{user_id}", recipe_ids, ttl=self._idle_ttl)
+        return list(recipe_ids)
+
+    async def set_ingredients(self, user_id, ingredients):
+        await self._backend.set(f"ingredients:{user_id}", ingredients, ttl=self._idle_ttl)
+
+    async def get_ingredients(self, user_id):
+        return await self._backend.get(f"ingredients:{user_id}")
+
+
+recipe_store = RecipeStore(max_size=RECIPE_STORE_SIZE)
+session_store = SessionStore(state_backend, idle_ttl=SESSION_IDLE_TTL)
+
+async def get_session_recipes(user_id):
+    """Records of the user's last search, in result order."""
+    return await recipe_store.get_many(await session_store.get_recipe_ids(user_id))
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from src.services.upstream_scheduler import BACKGROUND, upstream_context
+from src.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_ingredients(ingredients):
+    """Canonical ingredient set: lowercased, whitespace-collapsed, de-duplicated and sorted."""
+    return tuple(sorted({" ".join(ingredient.lower().split())
+                         for ingredient in ingredients if ingredient and ingredient.strip()}))
+
+
+def search_key(ingredients, number, ranking):
+    """Cache key of a findByIngredients search."""
+    return (normalize_ingredients(ingredients), ranking, number)
+
+
+class _SharedStream:
+    """Items of one in-flight search, replayed to every subscriber as they arrive."""
+
+    def __init__(self):
+        self.items = []
+        self._changed = asyncio.Event()
+
+    def append(self, item):
+        self.items.append(item)
+        self.notify()
+
+    def notify(self, *args):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, task):
+        """Yield the items seen so far and then the new ones, until `task` is done; re-raises its error."""
+        seen = 0
+        while True:
+            changed = self._changed
+            while seen < len(self.items):
+                seen += 1
+                yield self.items[seen - 1]
+            if task.done():
+                task.result()
+                return
+            await changed.wait()
+
+
+class SearchCache:
+    """Search results cache with stale-while-revalidate and in-flight request coalescing.
+
+    Results younger than `ttl` seconds are served as is. Results up to
+    `stale_ttl` seconds past that are served immediately while a single
+    background refresh runs. Concurrent misses for the same key share one
+    upstream call, whether they wait for the whole result or stream it.
+    """
+
+    def __init__(self, max_size=512, ttl=3600, stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.coalesced = 0
+        self._entries = LRUCache(max_size=max_size, ttl=ttl + stale_ttl)
+        self._in_flight = {}
+        self._streams = {}
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    @property
+    def misses(self):
+        return self._entries.misses
+
+    def get_cached(self, key, fetch):
+        """Cached result for `key` without waiting on upstream, None on a miss.
+
+        A stale result is returned as well, and refreshed in the background with `fetch`.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        result, fetched_at = entry
+        if time.monotonic() - fetched_at >= self.ttl:
+            # Stale: answer right away and refresh in the background, behind user requests
+            with upstream_context(priority=BACKGROUND):
+                task = self._refresh(key, fetch)
+            task.add_done_callback(_log_refresh_error)
+        return list(result)
+
+    def stream(self, key, produce):
+        """Iterate over the result for `key` as it arrives, sharing one upstream search.
+
+        `produce` is an async generator function yielding (rank position, item)
+        pairs; the first caller starts it and later ones subscribe to it. The
+        complete result is cached in rank order.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            stream = self._streams[key] = _SharedStream()
+            # A task, so that a subscriber going away doesn't stop the search for the others
+            task = self._in_flight[key] = asyncio.ensure_future(self._produce(key, produce, stream))
+            task.add_done_callback(stream.notify)
+            task.add_done_callback(_consume_error)
+        else:
+            self.coalesced += 1
+            stream = self._streams.get(key)
+        if stream is None:
+            # A plain refresh is running, its result comes all at once
+            return _iterate_result(task)
+        return stream.subscribe(task)
+
+    def fresh_for(self, key):
+        """Seconds until the cached result for `key` goes stale, None if there is none."""
+        entry = self._entries.peek(key)
+        if entry is None:
+            return None
+        return max(0.0, self.ttl - (time.monotonic() - entry[1]))
+
+    async def refresh(self, key, fetch):
+        """Fetch `key` anew even if cached, sharing a request already in flight."""
+        # Shield so a cancelled waiter doesn't cancel the request others wait on
+        return list(await asyncio.shield(self._refresh(key, fetch)))
+
+    def put(self, key, result):
+        """Store a result fetched outside of the cache."""
+        if result:
+            self._entries.set(key, (list(result), time.monotonic()))
+
+    def _refresh(self, key, fetch):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, fetch))
+            self._in_flight[key] = task
+        return task
+
+    async def _fetch(self, key, fetch):
+        try:
+            result = await fetch()
+            # Empty results usually mean an upstream error, don't pin them
+            self.put(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _produce(self, key, produce, stream):
+        try:
+            ranked = []
+            async for position, item in produce():
+                ranked.append((position, item))
+                stream.append(item)
+            result = [item for _, item in sorted(ranked, key=lambda pair: pair[0])]
+            self.put(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+            self._streams.pop(key, None)
+
+
+async def _iterate_result(task):
+    for item in await asyncio.shield(task):
+        yield item
+
+
+def _consume_error(task):
+    # Subscribers re-raise the error; this only keeps asyncio from warning when none are left
+    if not task.cancelled():
+        task.exception()
+
+
+def _log_refresh_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background search refresh failed: {task.exception()}")
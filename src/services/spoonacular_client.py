@@ -0,0 +1,214 @@
+import asyncio
+import importlib.util
+import logging
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+from src.services.upstream_scheduler import SPOONACULAR, QuotaExceededError
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SPOONACULAR_BASE_URL = "https://api.spoonacular.com"
+
+# Quota cost per endpoint, see https://spoonacular.com/food-api/pricing
+DETAILS_QUOTA_POINTS = 1
+BULK_FIRST_QUOTA_POINTS = 1
+BULK_EXTRA_QUOTA_POINTS = 0.5
+
+# Spoonacular answers 402 Payment Required once the daily quota is used up
+QUOTA_EXCEEDED_STATUS = 402
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _is_retryable(error):
+    """Retry on network errors, rate limiting and server-side failures."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _raise_quota_error(results):
+    """Partial results are fine after network errors, but not once the quota is gone."""
+    for result in results:
+        if isinstance(result, QuotaExceededError):
+            raise result
+
+
+def _bulk_quota_points(count):
+    """Quota points charged for one informationBulk call returning `count` recipes."""
+    return BULK_FIRST_QUOTA_POINTS + BULK_EXTRA_QUOTA_POINTS * (count - 1) if count else 0
+
+
+class BulkFetchStats:
+    """Round trips and quota points spent by bulk fetches versus one call per recipe."""
+
+    def __init__(self):
+        self.recipes = 0
+        self.round_trips = 0
+        self.quota_points = 0.0
+        self.per_id_round_trips = 0
+        self.per_id_quota_points = 0.0
+
+    @property
+    def saved_round_trips(self):
+        return self.per_id_round_trips - self.round_trips
+
+    @property
+    def saved_quota_points(self):
+        return self.per_id_quota_points - self.quota_points
+
+    def add(self, other):
+        self.recipes += other.recipes
+        self.round_trips += other.round_trips
+        self.quota_points += other.quota_points
+        self.per_id_round_trips += other.per_id_round_trips
+        self.per_id_quota_points += other.per_id_quota_points
+
+
+class SpoonacularClient:
+    """Async Spoonacular API client sharing one pooled HTTP connection."""
+
+    def __init__(self, api_key, base_url=SPOONACULAR_BASE_URL, timeout=10,
+                 max_concurrency=5, retries=3, bulk_chunk_size=50, transport=None, scheduler=None):
+        self._api_key = api_key
+        self._base_url = base_url
+        self._timeout = timeout
+        self._max_concurrency = max_concurrency
+        self._retries = retries
+        self._bulk_chunk_size = bulk_chunk_size
+        # Custom httpx transport, e.g. a MockTransport standing in for the API
+        self._transport = transport
+        # UpstreamScheduler every request waits on, if any
+        self._scheduler = scheduler
+        self._client = None
+        self._semaphore = None
+        self.bulk_stats = BulkFetchStats()
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                http2=HTTP2_AVAILABLE,
+                timeout=self._timeout,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=self._max_concurrency,
+                                    max_keepalive_connections=self._max_concurrency)
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._client
+
+    async def _get(self, path, params, timeout=None):
+        """GET a Spoonacular endpoint with retries and exponential backoff."""
+        client = self._get_client()
+        params = {**params, "apiKey": self._api_key}
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self._retries),
+            wait=wait_exponential(multiplier=0.5, max=8),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True
+        ):
+            with attempt:
+                if self._scheduler is not None:
+                    await self._scheduler.acquire(SPOONACULAR)
+                async with self._semaphore:
+                    response = await client.get(path, params=params,
+                                                timeout=timeout if timeout is not None else self._timeout)
+                if self._scheduler is not None:
+                    self._scheduler.record_quota(SPOONACULAR, response.headers)
+                if response.status_code == QUOTA_EXCEEDED_STATUS:
+                    if self._scheduler is not None:
+                        self._scheduler.exhaust_quota(SPOONACULAR)
+                    raise QuotaExceededError("Spoonacular daily quota is exhausted")
+                response.raise_for_status()
+        return response.json()
+
+    @metrics.timed("spoonacular.find_by_ingredients")
+    async def find_by_ingredients(self, ingredients, number, ranking, timeout=None):
+        """Search recipes that use the given ingredients."""
+        params = {
+            "ingredients": ",".join([ingredient.strip() for ingredient in ingredients]),
+            "number": number,
+            "ranking": ranking,
+            "ignorePantry": False,
+            "limitLicense": True
+        }
+        return await self._get("/recipes/findByIngredients", params, timeout)
+
+    @metrics.timed("spoonacular.get_recipe_details")
+    async def get_recipe_details(self, recipe_id, timeout=None):
+        """Fetch detailed information for a specific recipe."""
+        return await self._get(f"/recipes/{recipe_id}/information",
+                               {"includeNutrition": True}, timeout)
+
+    async def get_recipe_details_many(self, recipe_ids, timeout=None):
+        """Fetch details for all recipes concurrently.
+
+        Returns a dict keyed by recipe ID; recipes whose request failed are left out.
+        """
+        results = await asyncio.gather(
+            *(self.get_recipe_details(recipe_id, timeout) for recipe_id in recipe_ids),
+            return_exceptions=True
+        )
+        _raise_quota_error(results)
+        details_by_id = {}
+        for recipe_id, result in zip(recipe_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to fetch details for recipe {recipe_id}: {result}")
+                continue
+            details_by_id[recipe_id] = result
+        return details_by_id
+
+    @metrics.timed("spoonacular.get_recipe_details_bulk")
+    async def get_recipe_details_bulk(self, recipe_ids, timeout=None):
+        """Fetch details via informationBulk, one call per chunk of IDs.
+
+        IDs missing from the bulk responses are fetched one by one. Returns
+        the details keyed by recipe ID and the BulkFetchStats of this call.
+        """
+        stats = BulkFetchStats()
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return {}, stats
+
+        chunks = [recipe_ids[i:i + self._bulk_chunk_size]
+                  for i in range(0, len(recipe_ids), self._bulk_chunk_size)]
+        results = await asyncio.gather(
+            *(self._get("/recipes/informationBulk",
+                        {"ids": ",".join(str(recipe_id) for recipe_id in chunk), "includeNutrition": True},
+                        timeout)
+              for chunk in chunks),
+            return_exceptions=True
+        )
+
+        _raise_quota_error(results)
+        details_by_id = {}
+        for chunk, result in zip(chunks, results):
+            stats.round_trips += 1
+            if isinstance(result, Exception):
+                logger.warning(f"Bulk details request failed for {len(chunk)} recipes: {result}")
+                continue
+            stats.quota_points += _bulk_quota_points(len(result))
+            for details in result:
+                details_by_id[details.get('id')] = details
+
+        missing_ids = [recipe_id for recipe_id in recipe_ids if recipe_id not in details_by_id]
+        if missing_ids:
+            logger.info(f"Bulk response missed {len(missing_ids)} recipes, fetching them one by one")
+            fallback = await self.get_recipe_details_many(missing_ids, timeout)
+            stats.round_trips += len(missing_ids)
+            stats.quota_points += DETAILS_QUOTA_POINTS * len(fallback)
+            details_by_id.update(fallback)
+
+        stats.recipes = len(details_by_id)
+        stats.per_id_round_trips = len(recipe_ids)
+        stats.per_id_quota_points = DETAILS_QUOTA_POINTS * len(details_by_id)
+        self.bulk_stats.add(stats)
+        return details_by_id, stats
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
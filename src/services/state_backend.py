@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+import math
+import uuid
+from contextlib import asynccontextmanager
+from config.config import STATE_BACKEND, REDIS_URL, STATE_MAX_KEYS, USER_LOCK_TIMEOUT
+from src.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "recipe_bot:"
+# Seconds between attempts to take a lock held by another worker
+LOCK_POLL_INTERVAL = 0.05
+# Deletes the lock only if it still holds our token, in one step: the lock could expire between a GET and a DEL
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class InProcessBackend:
+    """Per-user state and locks in this process' memory, for a single bot worker.
+
+    Values are stored as is, without serialization.
+    """
+
+    def __init__(self, max_keys=100000):
+        self._values = LRUCache(max_size=max_keys)
+        self._locks = {}
+
+    async def get(self, key):
+        return self._values.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._values.set(key, value, ttl=ttl)
+
+    async def delete(self, key):
+        self._values.pop(key)
+
+    @asynccontextmanager
+    async def lock(self, name):
+        """Exclusive section per name, e.g. per user."""
+        lock, waiters = self._locks.get(name, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[name] = (lock, waiters + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, waiters = self._locks[name]
+            if waiters == 1:
+                del self._locks[name]
+            else:
+                self._locks[name] = (lock, waiters - 1)
+
+    async def aclose(self):
+        pass
+
+
+class RedisBackend:
+    """Per-user state and locks shared by several bot workers through Redis.
+
+    `client` is a redis.asyncio.Redis or anything with the same get, set,
+    delete and eval coroutines. Values are stored as JSON.
+    """
+
+    def __init__(self, client, prefix=REDIS_KEY_PREFIX, lock_timeout=60):
+        self._client = client
+        self._prefix = prefix
+        self._lock_timeout = lock_timeout
+
+    async def get(self, key):
+        value = await self._client.get(self._prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value, ttl=None):
+        # Arrays of IDs are stored as plain lists
+        # Redis takes whole milliseconds
+        await self._client.set(self._prefix + key, json.dumps(value, default=list),
+                               px=math.ceil(ttl * 1000) if ttl else None)
+
+    async def delete(self, key):
+        await self._client.delete(self._prefix + key)
+
+    @asynccontextmanager
+    async def lock(self, name):
+        """Exclusive section per name across workers.
+
+        Waiters poll for the lock, so it gives mutual exclusion but not
+        arrival order. The lock expires after `lock_timeout` seconds, so a
+        crashed worker can't hold it forever.
+        """
+        key = f"{self._prefix}lock:{name}"
+        token = uuid.uuid4().hex
+        while not await self._client.set(key, token, nx=True, px=int(self._lock_timeout * 1000)):
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            # Don't release a lock that expired and was taken by someone else
+            await self._client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def create_state_backend(name=STATE_BACKEND, redis_url=REDIS_URL):
+    """State backend chosen in the config: "memory" or "redis"."""
+    if name == "memory":
+        return InProcessBackend(max_keys=STATE_MAX_KEYS)
+    if name == "redis":
+        try:
+            import redis.asyncio
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND = 'redis' needs the redis package: pip install redis") from e
+        return RedisBackend(redis.asyncio.from_url(redis_url), lock_timeout=USER_LOCK_TIMEOUT)
+    raise ValueError(f"Unknown state backend: {name!r}")
+
+
+state_backend = create_state_backend()
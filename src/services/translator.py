@@ -1,30 +1,163 @@
+import hashlib
+import logging
+import re
+import threading
 from deep_translator import GoogleTranslator
 from bs4 import BeautifulSoup
+from config.config import (TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MAX_ENTRIES,
+                           TRANSLATION_CACHE_MEMORY_SIZE)
+from src.services.upstream_scheduler import TRANSLATOR, upstream_scheduler
+from src.utils.cache import SQLiteStore, TieredCache
+from src.utils.metrics import metrics
 
+logger = logging.getLogger(__name__)
+
+# Google Translate rejects texts over 5000 characters
+MAX_BATCH_CHARS = 4500
+# Joins batched strings; the symbol is left untranslated and is removed from inputs beforehand
+BATCH_SEPARATOR_SYMBOL = "⁂"
+BATCH_DELIMITER = f"\n{BATCH_SEPARATOR_SYMBOL}\n"
+_BATCH_SPLIT_PATTERN = re.compile(rf"\s*{BATCH_SEPARATOR_SYMBOL}\s*")
+
+# Translations don't go stale, so entries are only evicted by size
+translation_cache = TieredCache(
+    SQLiteStore(TRANSLATION_CACHE_PATH, table="translations",
+                max_entries=TRANSLATION_CACHE_MAX_ENTRIES),
+    memory_size=TRANSLATION_CACHE_MEMORY_SIZE
+)
+metrics.register_cache("translations", translation_cache)
+
+# GoogleTranslator keeps request state on the instance, so share instances per thread only
+_local = threading.local()
+
+def _get_translator(source, target):
+    """Reuse one translator per language pair in the calling thread."""
+    translators = _local.__dict__.setdefault('translators', {})
+    if (source, target) not in translators:
+        translators[(source, target)] = GoogleTranslator(source=source, target=target)
+    return translators[(source, target)]
+
+@metrics.timed("translator.google_request")
+def _call_translator(source, target, text):
+    """Send one request to Google Translate once the upstream scheduler allows it."""
+    upstream_scheduler.acquire_blocking(TRANSLATOR)
+    return _get_translator(source, target).translate(text)
+
+def _cache_key(source, target, text):
+    return f"{source}:{target}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+@metrics.timed("translator.translate")
+def translate(text, source, target):
+    """Translate text, memoizing the result."""
+    key = _cache_key(source, target, text)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+    translated = _call_translator(source, target, text)
+    translation_cache.set(key, translated)
+    return translated
+
+@metrics.timed("translator.translate_batch")
+def translate_batch(texts, source='en', target='ru'):
+    """Translate many strings with as few upstream calls as possible.
+
+    Cached and repeated strings are not sent again; the rest are joined
+    into requests of up to MAX_BATCH_CHARS characters.
+    """
+    results = [""] * len(texts)
+    pending = {}
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        cached = translation_cache.get(_cache_key(source, target, text))
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(text, []).append(i)
+
+    for chunk in _split_into_batches(list(pending)):
+        for text, translated in zip(chunk, _translate_joined(chunk, source, target)):
+            translation_cache.set(_cache_key(source, target, text), translated)
+            for i in pending[text]:
+                results[i] = translated
+    return results
+
+def _split_into_batches(texts):
+    batches, batch, size = [], [], 0
+    for text in texts:
+        added = len(text) + (len(BATCH_DELIMITER) if batch else 0)
+        if batch and size + added > MAX_BATCH_CHARS:
+            batches.append(batch)
+            batch, size, added = [], 0, len(text)
+        batch.append(text)
+        size += added
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _translate_joined(texts, source, target):
+    """Translate texts in one request, one by one if the delimiters don't survive."""
+    if len(texts) == 1:
+        return [_call_translator(source, target, texts[0])]
+
+    joined = BATCH_DELIMITER.join(text.replace(BATCH_SEPARATOR_SYMBOL, "") for text in texts)
+    parts = _BATCH_SPLIT_PATTERN.split(_call_translator(source, target, joined).strip())
+    if len(parts) == len(texts):
+        return [part.strip() for part in parts]
+
+    logger.warning(f"Batch translation returned {len(parts)} parts for {len(texts)} texts, "
+                   f"translating one by one")
+    return [_call_translator(source, target, text) for text in texts]
+
+@metrics.timed("translator.translate_to_english")
 def translate_to_english(text):
     """Translate text from Russian to English."""
-    return GoogleTranslator(source='ru', target='en').translate(text)
+    return translate(text, 'ru', 'en')
 
+@metrics.timed("translator.translate_to_russian")
 def translate_to_russian(text):
     """Translate text from English to Russian."""
     if not text:
         return ""
-    return GoogleTranslator(source='en', target='ru').translate(text)
+    return translate(text, 'en', 'ru')
 
+@metrics.timed("translator.clean_and_translate_instructions")
 def clean_and_translate_instructions(instructions):
     if not instructions:
         return "Инструкции отсутствуют"
-    
-    steps = instructions.split('\n') if '\n' in instructions else instructions.split('.')
-    steps = [step.strip() for step in steps if step.strip()]
-    
-    return "\n\n".join(f"Шаг {i+1}: {translate_to_russian(step)}" 
-                      for i, step in enumerate(steps))
+    return _format_steps(translate_batch(_split_steps(instructions)))
 
 
+@metrics.timed("translator.clean_and_translate_summary")
 def clean_and_translate_summary(summary):
     """Clean HTML from summary and translate to Russian."""
     if not summary:
         return ""
-    clean_text = BeautifulSoup(summary, 'html.parser').get_text()
-    return translate_to_russian(clean_text)
+    return translate_to_russian(_clean_html(summary))
+
+@metrics.timed("translator.clean_and_translate_summaries")
+def clean_and_translate_summaries(summaries):
+    """Clean HTML from summaries and translate them to Russian in one batch."""
+    return translate_batch([_clean_html(summary) if summary else "" for summary in summaries])
+
+@metrics.timed("translator.translate_recipe_texts")
+def translate_recipe_texts(title, summary, instructions):
+    """Translate a recipe's title, summary and instruction steps in one batch.
+
+    Returns the translated title, summary and formatted instructions.
+    """
+    steps = _split_steps(instructions) if instructions else []
+    translated = translate_batch([title or "", _clean_html(summary) if summary else "", *steps])
+    translated_instructions = _format_steps(translated[2:]) if steps else "Инструкции отсутствуют"
+    return translated[0], translated[1], translated_instructions
+
+def _split_steps(instructions):
+    steps = instructions.split('\n') if '\n' in instructions else instructions.split('.')
+    return [step.strip() for step in steps if step.strip()]
+
+def _format_steps(steps):
+    return "\n\n".join(f"Шаг {i+1}: {step}" for i, step in enumerate(steps))
+
+@metrics.timed("translator.clean_html")
+def _clean_html(text):
+    return BeautifulSoup(text, 'html.parser').get_text()
@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from config.config import (SPOONACULAR_RATE_LIMIT, SPOONACULAR_RATE_BURST, SPOONACULAR_QUOTA_RESERVE,
+                           TRANSLATOR_RATE_LIMIT, TRANSLATOR_RATE_BURST)
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SPOONACULAR = "spoonacular"
+TRANSLATOR = "translator"
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_user_id = contextvars.ContextVar('upstream_user_id', default=None)
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+_UNSET = object()
+
+
+@contextmanager
+def upstream_context(user_id=_UNSET, priority=_UNSET):
+    """Attribute upstream calls made inside the block to a user and priority.
+
+    The values follow the calls into tasks and asyncio.to_thread workers
+    started inside the block.
+    """
+    tokens = []
+    if user_id is not _UNSET:
+        tokens.append((_user_id, _user_id.set(user_id)))
+    if priority is not _UNSET:
+        tokens.append((_priority, _priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class QuotaExceededError(Exception):
+    """The daily Spoonacular quota is used up, or reserved for interactive requests."""
+
+
+def _next_quota_reset(now=None):
+    """Spoonacular quotas reset at midnight UTC."""
+    now = now or datetime.now(timezone.utc)
+    return (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def try_take(self):
+        """Take a token; returns 0 on success, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def give_back(self):
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class DailyQuota:
+    """Spoonacular quota points as reported by the X-API-Quota-* response headers.
+
+    Background calls are refused once fewer than `reserve` points are left,
+    so that interactive requests can still be answered.
+    """
+
+    def __init__(self, reserve=0):
+        self.reserve = reserve
+        self.used = None
+        self.left = None
+        self._exhausted = False
+        self._resets_at = _next_quota_reset()
+
+    def record(self, headers):
+        self._roll_over()
+        used, left = headers.get('X-API-Quota-Used'), headers.get('X-API-Quota-Left')
+        try:
+            if used is not None:
+                self.used = float(used)
+            if left is not None:
+                self.left = float(left)
+        except ValueError:
+            logger.warning(f"Unexpected quota headers: used={used!r}, left={left!r}")
+            return
+        if self.left is not None and self.left <= 0:
+            self.exhaust()
+
+    def exhaust(self):
+        if not self._exhausted:
+            logger.warning(f"Spoonacular daily quota exhausted (used: {self.used}), "
+                           f"failing requests until {datetime.fromtimestamp(self._resets_at, timezone.utc):%H:%M} UTC")
+        self._exhausted = True
+
+    def check(self, priority):
+        """Raise QuotaExceededError if a call with this priority must not be made."""
+        self._roll_over()
+        if self._exhausted:
+            raise QuotaExceededError("Spoonacular daily quota is exhausted")
+        if priority >= BACKGROUND and self.left is not None and self.left < self.reserve:
+            raise QuotaExceededError(f"Only {self.left:g} Spoonacular quota points left, "
+                                     f"keeping them for interactive requests")
+
+    def _roll_over(self):
+        if time.time() >= self._resets_at:
+            self.used = self.left = None
+            self._exhausted = False
+            self._resets_at = _next_quota_reset()
+
+
+class _FairQueue:
+    """Waiters per priority, served round-robin across users within a priority."""
+
+    def __init__(self):
+        self._users = {}
+        self._size = 0
+
+    def push(self, priority, user_id, waiter):
+        users = self._users.setdefault(priority, OrderedDict())
+        users.setdefault(user_id, deque()).append(waiter)
+        self._size += 1
+
+    def pop(self):
+        """Next waiter still waiting, or None."""
+        for priority in sorted(self._users):
+            users = self._users[priority]
+            while users:
+                user_id, waiters = next(iter(users.items()))
+                waiter = waiters.popleft()
+                self._size -= 1
+                if waiters:
+                    # The user goes to the back of the line for their next call
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def __len__(self):
+        return self._size
+
+
+class UpstreamScheduler:
+    """Single gate for calls to rate-limited upstream services.
+
+    Each upstream has a token bucket. Calls that can't go at once wait in a
+    queue where interactive calls go before background ones and users take
+    turns, so one busy chat can't starve the others. Spoonacular calls also
+    fail fast with QuotaExceededError once the daily quota is used up.
+    """
+
+    def __init__(self, buckets, quotas=None):
+        self._buckets = buckets
+        self._quotas = quotas or {}
+        self._queues = {upstream: _FairQueue() for upstream in buckets}
+        self._dispatchers = {}
+        self._loop = None
+
+    def quota(self, upstream):
+        return self._quotas.get(upstream)
+
+    def bind(self, loop):
+        """Event loop that calls from worker threads are queued on."""
+        self._loop = loop
+
+    async def acquire(self, upstream):
+        """Wait for the turn of the current user and priority to call `upstream`."""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        priority = _priority.get()
+        quota = self._quotas.get(upstream)
+        if quota is not None:
+            quota.check(priority)
+
+        queue = self._queues[upstream]
+        if not queue and self._buckets[upstream].try_take() == 0:
+            return
+
+        waiter = loop.create_future()
+        queue.push(priority, _user_id.get(), waiter)
+        dispatcher = self._dispatchers.get(upstream)
+        if dispatcher is None or dispatcher.done() or dispatcher.get_loop() is not loop:
+            self._dispatchers[upstream] = asyncio.ensure_future(self._dispatch(upstream))
+        await waiter
+        # The quota may have run out while waiting
+        if quota is not None:
+            quota.check(priority)
+
+    def acquire_blocking(self, upstream):
+        """acquire() for synchronous code running in a worker thread.
+
+        Without a running event loop to queue on, e.g. in scripts, the call
+        goes ahead unscheduled.
+        """
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            # Blocking the loop on itself would deadlock
+            return
+        asyncio.run_coroutine_threadsafe(self.acquire(upstream), loop).result()
+
+    async def _dispatch(self, upstream):
+        queue, bucket = self._queues[upstream], self._buckets[upstream]
+        try:
+            while queue:
+                wait = bucket.try_take()
+                if wait:
+                    await asyncio.sleep(wait)
+                    continue
+                waiter = queue.pop()
+                if waiter is None:
+                    bucket.give_back()
+                    break
+                waiter.set_result(None)
+        finally:
+            if self._dispatchers.get(upstream) is asyncio.current_task():
+                del self._dispatchers[upstream]
+
+    def record_quota(self, upstream, headers):
+        quota = self._quotas.get(upstream)
+        if quota is not None:
+            quota.record(headers)
+
+    def exhaust_quota(self, upstream):
+        quota = self._quotas.get(upstream)
+        if quota is not None:
+            quota.exhaust()
+
+    def queued(self, upstream):
+        return len(self._queues[upstream])
+
+
+upstream_scheduler = UpstreamScheduler(
+    buckets={
+        SPOONACULAR: TokenBucket(SPOONACULAR_RATE_LIMIT, SPOONACULAR_RATE_BURST),
+        TRANSLATOR: TokenBucket(TRANSLATOR_RATE_LIMIT, TRANSLATOR_RATE_BURST)
+    },
+    quotas={SPOONACULAR: DailyQuota(reserve=SPOONACULAR_QUOTA_RESERVE)}
+)
+metrics.register_gauge("spoonacular_quota_left", "Spoonacular quota points left today, as last reported",
+                       lambda: upstream_scheduler.quota(SPOONACULAR).left)
+metrics.register_gauge("spoonacular_queued_calls", "Spoonacular calls waiting for their turn",
+                       lambda: upstream_scheduler.queued(SPOONACULAR))
+metrics.register_gauge("translator_queued_calls", "Translator calls waiting for their turn",
+                       lambda: upstream_scheduler.queued(TRANSLATOR))
@@ -0,0 +1,247 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Value for `key` without counting a hit or miss or refreshing its LRU position."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+                return default
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class BytesLRUCache:
+    """Thread-safe LRU cache of bytes values bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._data[key] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """Persistent JSON key-value store in SQLite with TTL and LRU eviction.
+
+    Entries older than `ttl` seconds are treated as missing; once the table
+    holds more than `max_entries` rows the least recently used ones are deleted.
+    A hit records its access time only if the last one is more than
+    `touch_interval` seconds old, so most reads don't write.
+    """
+
+    def __init__(self, path, table="cache", ttl=None, max_entries=None, touch_interval=60):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            # Readers don't wait for writers; a lost commit on power failure only costs a cache entry
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """(value, created_at) for `key`, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                f"SELECT value, created_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at, accessed_at = row
+            if self.ttl and created_at + self.ttl <= now:
+                connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            if accessed_at + self.touch_interval <= now:
+                connection.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                connection.commit()
+        return json.loads(value), created_at
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if self.max_entries:
+                connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            connection.commit()
+
+    def delete(self, key):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            connection.commit()
+
+    def items(self):
+        """All unexpired (key, value) pairs, least recently used first, without refreshing their access time."""
+        oldest = time.time() - self.ttl if self.ttl else 0
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT key, value FROM {self.table} WHERE created_at > ? ORDER BY accessed_at", (oldest,)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class TieredCache:
+    """In-memory LRU layer in front of a persistent SQLiteStore."""
+
+    def __init__(self, store, memory_size=256):
+        self.store = store
+        self.memory = LRUCache(max_size=memory_size, ttl=store.ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING:
+            entry = self.store.get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, created_at = entry
+            if self.store.ttl:
+                # Kept in memory only for what is left of its lifetime on disk
+                remaining = created_at + self.store.ttl - time.time()
+                if remaining > 0:
+                    self.memory.set(key, value, ttl=remaining)
+            else:
+                self.memory.set(key, value)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.store.set(key, value)
+
+    def delete(self, key):
+        self.memory.pop(key)
+        self.store.delete(key)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
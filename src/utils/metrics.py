@@ -0,0 +1,224 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "recipe_bot"
+# Upper bounds in seconds, from a cached lookup to a slow upstream call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_trace = ContextVar('metrics_trace', default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class _Trace:
+    """Spans recorded while handling one update."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def log(self, error):
+        total = time.perf_counter() - self.started
+        spans = ", ".join(f"{name} {offset * 1000:.0f}+{duration * 1000:.0f}ms{' !' if failed else ''}"
+                          for name, offset, duration, failed in self.spans)
+        logger.info(f"Trace {self.id} {self.name}: {total * 1000:.0f}ms{' (failed)' if error else ''} [{spans}]")
+
+
+class MetricsRegistry:
+    """Per-stage latency, call and error counts, plus cache and gauge readings taken at scrape time.
+
+    Stages are named "<area>.<operation>", e.g. "translator.translate_batch".
+    """
+
+    def __init__(self):
+        self.trace_spans = False
+        self._latency = {}
+        self._calls = {}
+        self._errors = {}
+        self._caches = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, error=False):
+        with self._lock:
+            histogram = self._latency.get(stage)
+            if histogram is None:
+                histogram = self._latency[stage] = Histogram()
+            histogram.observe(seconds)
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+            if error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append((stage, time.perf_counter() - seconds - trace.started, seconds, error))
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as one call of the stage; exceptions count as errors and propagate."""
+        started = time.perf_counter()
+        try:
+            yield
+        except GeneratorExit:
+            # A consumer that stops iterating early is not a failure
+            self.observe(name, time.perf_counter() - started)
+            raise
+        except BaseException:
+            self.observe(name, time.perf_counter() - started, error=True)
+            raise
+        self.observe(name, time.perf_counter() - started)
+
+    @contextmanager
+    def trace(self, name):
+        """Log the spans of all stages run inside the block, if trace spans are enabled."""
+        if not self.trace_spans or _trace.get() is not None:
+            yield
+            return
+        trace = _trace.set(_Trace(name))
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _trace.get().log(error)
+            _trace.reset(trace)
+
+    def timed(self, stage, trace=False):
+        """Decorator timing a function, coroutine function or async generator as a stage.
+
+        With trace=True the call also starts a trace, e.g. for bot handlers.
+        """
+        def decorator(function):
+            if inspect.isasyncgenfunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    with self.trace(stage) if trace else _nothing(), self.stage(stage):
+                        async for item in function(*args, **kwargs):
+                            yield item
+            elif inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    with self.trace(stage) if trace else _nothing(), self.stage(stage):
+                        return await function(*args, **kwargs)
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    with self.trace(stage) if trace else _nothing(), self.stage(stage):
+                        return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_cache(self, name, cache):
+        """Export the hits and misses counters of a cache."""
+        self._caches[name] = cache
+
+    def register_gauge(self, name, help_text, read):
+        """Export the value returned by `read()` at scrape time; None leaves it out."""
+        self._gauges[name] = (help_text, read)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            latency = {stage: (list(h.counts), h.sum, h.buckets) for stage, h in self._latency.items()}
+            calls, errors = dict(self._calls), dict(self._errors)
+
+        lines = [f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent per stage",
+                 f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram"]
+        for stage, (counts, total, buckets) in sorted(latency.items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        lines += _counter_lines("stage_calls_total", "Calls per stage", "stage", calls)
+        lines += _counter_lines("stage_errors_total", "Failed calls per stage", "stage",
+                                {stage: errors.get(stage, 0) for stage in calls})
+
+        caches = {name: (cache.hits, cache.misses) for name, cache in self._caches.items()}
+        lines += _counter_lines("cache_hits_total", "Cache hits", "cache",
+                                {name: hits for name, (hits, _) in caches.items()})
+        lines += _counter_lines("cache_misses_total", "Cache misses", "cache",
+                                {name: misses for name, (_, misses) in caches.items()})
+        lines += [f"# HELP {METRIC_PREFIX}_cache_hit_ratio Share of cache lookups that hit",
+                  f"# TYPE {METRIC_PREFIX}_cache_hit_ratio gauge"]
+        lines += [f'{METRIC_PREFIX}_cache_hit_ratio{{cache="{name}"}} {hits / (hits + misses) if hits + misses else 0}'
+                  for name, (hits, misses) in sorted(caches.items())]
+
+        for name, (help_text, read) in sorted(self._gauges.items()):
+            value = read()
+            if value is not None:
+                lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} gauge",
+                          f"{METRIC_PREFIX}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def _nothing():
+    yield
+
+
+def _counter_lines(name, help_text, label, values):
+    lines = [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} counter"]
+    lines += [f'{METRIC_PREFIX}_{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics for Prometheus from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,14 @@
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+try:
+    import config.config  # noqa: F401
+except ModuleNotFoundError:
+    # Without a local config the tests run against the template defaults
+    sys.modules['config.config'] = importlib.import_module('config.configTemplate')
@@ -0,0 +1,53 @@
+import time
+
+from src.services.state_backend import RELEASE_LOCK_SCRIPT
+
+
+class FakeRedis:
+    """In-memory stand-in for redis.asyncio.Redis, with just what RedisBackend uses.
+
+    Like redis-py, it takes expiry times as whole seconds or milliseconds only,
+    and eval runs only the lock release script.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self.closed = False
+
+    def _alive(self, key):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            entry = None
+        return entry
+
+    async def get(self, key):
+        entry = self._alive(key)
+        return entry[0] if entry is not None else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        for name, expiry in (("ex", ex), ("px", px)):
+            if expiry is not None and not isinstance(expiry, int):
+                raise ValueError(f"{name} must be datetime.timedelta or int")
+        if nx and self._alive(key) is not None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        ttl = ex if ex is not None else px / 1000 if px is not None else None
+        self._values[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        assert script == RELEASE_LOCK_SCRIPT and numkeys == 1
+        key, token = keys_and_args
+        entry = self._alive(key)
+        if entry is not None and entry[0] == token.encode():
+            del self._values[key]
+            return 1
+        return 0
+
+    async def aclose(self):
+        self.closed = True
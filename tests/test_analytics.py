@@ -0,0 +1,23 @@
+import types
+
+from src.services import analytics_service, ingredient_lexicon
+
+
+def test_ingredient_names_fall_back_to_english_when_translation_fails(monkeypatch):
+    calls = []
+
+    def translate(name):
+        calls.append(name)
+        if name == "quince":
+            raise ConnectionError("translator down")
+        return {"rice": "рис"}[name]
+
+    monkeypatch.setattr(ingredient_lexicon, "translate_ingredient_to_russian", translate)
+    recipes = [types.SimpleNamespace(ingredients=["rice", "quince"]),
+               types.SimpleNamespace(ingredients=["quince"])]
+
+    names = analytics_service._translated_ingredient_names(recipes)
+
+    assert names == ["рис", "quince", "quince"]
+    # A failing name is tried once per request
+    assert calls == ["rice", "quince"]
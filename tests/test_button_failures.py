@@ -0,0 +1,81 @@
+import asyncio
+
+from fakes import FakeSpoonacular, install, make_update
+
+from src.bot.handlers import ButtonHandlers
+from src.services import recipe_service
+from src.services.recipe_store import recipe_store, session_store
+
+USER_ID = 7
+
+
+async def _search_and_evict(spoonacular):
+    """A session with a found recipe whose recipe-cache entry is gone and whose details now fail upstream."""
+    recipes = [recipe async for recipe in recipe_service.iter_recipes(["tofu"], number=2)]
+    await session_store.start(USER_ID)
+    for recipe in recipes:
+        record = recipe_store.add(recipe)
+        record.summary = record.instructions = None
+        await session_store.append(USER_ID, record.id)
+        recipe_service.recipe_cache.delete(str(record.id))
+    spoonacular.error_rate = 1.0
+    return [recipe['id'] for recipe in recipes]
+
+
+def _press(data):
+    update, context, sent = make_update(USER_ID, data=data)
+    return ButtonHandlers.handle_button(update, context), sent
+
+
+def test_cards_are_shown_without_summaries_when_details_fail(tmp_path):
+    spoonacular = FakeSpoonacular()
+    install(spoonacular, str(tmp_path))
+
+    async def run():
+        try:
+            ids = await _search_and_evict(spoonacular)
+            press, sent = _press("show_all")
+            await press
+            return ids, sent
+        finally:
+            await recipe_service.close_client()
+
+    ids, sent = asyncio.run(run())
+    assert [kind for kind, _ in sent] == ["photo"] * len(ids)
+
+
+def test_instructions_reply_when_details_fail(tmp_path):
+    spoonacular = FakeSpoonacular()
+    install(spoonacular, str(tmp_path))
+
+    async def run():
+        try:
+            ids = await _search_and_evict(spoonacular)
+            press, sent = _press(f"instructions_{ids[0]}")
+            await press
+            return sent
+        finally:
+            await recipe_service.close_client()
+
+    assert asyncio.run(run()) == [("text", "Инструкции для этого рецепта недоступны")]
+
+
+def test_fetched_details_are_cached_again(tmp_path):
+    spoonacular = FakeSpoonacular()
+    install(spoonacular, str(tmp_path))
+
+    async def run():
+        try:
+            ids = await _search_and_evict(spoonacular)
+            spoonacular.error_rate = 0.0
+            for _ in range(2):
+                press, sent = _press(f"instructions_{ids[0]}")
+                (await recipe_store.get(ids[0])).instructions = None
+                await press
+            return sent
+        finally:
+            await recipe_service.close_client()
+
+    sent = asyncio.run(run())
+    assert sent[0][1].startswith("Шаг 1")
+    assert spoonacular.requests['information'] == 1
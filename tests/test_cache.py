@@ -0,0 +1,35 @@
+import time
+
+from src.utils.cache import SQLiteStore, TieredCache
+
+
+def test_store_uses_write_ahead_logging(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    store.set("key", 1)
+
+    assert store._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_hits_record_access_time_once_per_interval(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"), touch_interval=60)
+    store.set("key", {"value": 1})
+    connection = store._connect()
+    changes = connection.total_changes
+
+    for _ in range(5):
+        assert store.get("key") == {"value": 1}
+
+    assert connection.total_changes == changes
+
+
+def test_promoted_entry_expires_with_the_one_on_disk(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path / "cache.db"), ttl=1)
+    store.set("key", "value")
+    # The entry was written 0.9 s ago
+    now = time.time
+    monkeypatch.setattr(time, 'time', lambda: now() + 0.9)
+    cache = TieredCache(store)
+
+    assert cache.get("key") == "value"
+    time.sleep(0.15)
+    assert cache.get("key") is None
@@ -0,0 +1,48 @@
+from fakes import load_fixture, make_recipe_details
+
+from src.services.recipe_index import RecipeIndex
+from src.utils.cache import SQLiteStore
+
+
+def _index(tmp_path, max_entries):
+    return RecipeIndex(SQLiteStore(str(tmp_path / "index.sqlite3"), table="recipe_index", max_entries=max_entries))
+
+
+def _details(recipe_id, *ingredients):
+    details = make_recipe_details(load_fixture(), recipe_id)
+    details['extendedIngredients'] = [{"id": i, "name": name} for i, name in enumerate(ingredients)]
+    return details
+
+
+def test_search_matches_ingredients(tmp_path):
+    index = _index(tmp_path, 10)
+    index.add_many([_details(1, "chicken breast", "rice"), _details(2, "salmon")])
+
+    results, coverage = index.search(["chicken", "rice"], number=1)
+
+    assert [recipe['id'] for recipe in results] == [1]
+    assert results[0]['usedIngredientCount'] == 2
+    assert coverage == 1.0
+
+
+def test_memory_is_capped_like_the_store(tmp_path):
+    index = _index(tmp_path, 2)
+    index.add_many([_details(1, "quince"), _details(2, "rice"), _details(3, "salmon")])
+
+    assert len(index) == 2
+    assert index.search(["quince"], number=1) == ([], 0.0)
+    assert "quince" not in index._postings
+    assert [recipe['id'] for recipe in index.search(["salmon"], number=1)[0]] == [3]
+
+    # A fresh process loads the same recipes from the store
+    reloaded = RecipeIndex(index.store)
+    assert len(reloaded) == 2
+    assert reloaded.search(["quince"], number=1) == ([], 0.0)
+
+
+def test_reindexing_a_recipe_keeps_it(tmp_path):
+    index = _index(tmp_path, 2)
+    index.add_many([_details(1, "quince"), _details(2, "rice"), _details(1, "quince"), _details(3, "salmon")])
+
+    assert [recipe['id'] for recipe in index.search(["quince"], number=1)[0]] == [1]
+    assert index.search(["rice"], number=1) == ([], 0.0)
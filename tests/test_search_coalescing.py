@@ -0,0 +1,48 @@
+import asyncio
+
+from fakes import FakeSpoonacular, install
+
+from src.services import recipe_service
+
+
+async def _collect(ingredients):
+    return [recipe async for recipe in recipe_service.iter_recipes(ingredients, number=3)]
+
+
+def test_concurrent_identical_searches_share_one_upstream_search(tmp_path):
+    spoonacular = FakeSpoonacular(latency=0.05)
+    install(spoonacular, str(tmp_path))
+
+    async def run():
+        try:
+            return await asyncio.gather(_collect(["chicken", "rice"]), _collect(["Rice", " chicken"]))
+        finally:
+            await recipe_service.close_client()
+
+    first, second = asyncio.run(run())
+
+    assert spoonacular.requests['findByIngredients'] == 1
+    assert spoonacular.requests['informationBulk'] == 1
+    assert sorted(recipe['id'] for recipe in first) == sorted(recipe['id'] for recipe in second)
+    assert len(first) == 3
+    assert recipe_service.search_cache.coalesced == 1
+
+
+def test_subscriber_leaving_early_does_not_stop_the_search(tmp_path):
+    spoonacular = FakeSpoonacular(latency=0.05)
+    install(spoonacular, str(tmp_path))
+
+    async def first_only():
+        async for recipe in recipe_service.iter_recipes(["egg"], number=3):
+            return recipe
+
+    async def run():
+        try:
+            return await asyncio.gather(first_only(), _collect(["egg"]))
+        finally:
+            await recipe_service.close_client()
+
+    _, complete = asyncio.run(run())
+
+    assert len(complete) == 3
+    assert spoonacular.requests['findByIngredients'] == 1
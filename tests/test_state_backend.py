@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+from fake_redis import FakeRedis
+
+from src.bot.update_processor import PerUserUpdateProcessor
+from src.services.recipe_store import SessionStore
+from src.services.state_backend import InProcessBackend, RedisBackend
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return InProcessBackend(max_keys=100)
+    return RedisBackend(FakeRedis(), lock_timeout=5)
+
+
+def test_session_round_trip(backend):
+    sessions = SessionStore(backend, idle_ttl=60)
+
+    async def run():
+        await sessions.start(1)
+        for recipe_id in (3, 1, 2):
+            await sessions.append(1, recipe_id)
+        await sessions.set_ingredients(1, "курица, рис")
+        return (await sessions.get_recipe_ids(1), await sessions.get_ingredients(1),
+                await sessions.get_recipe_ids(2), await sessions.get_ingredients(2))
+
+    assert asyncio.run(run()) == ([3, 1, 2], "курица, рис", [], None)
+
+
+def test_values_expire(backend):
+    async def run():
+        await backend.set("key", {"a": 1}, ttl=0.05)
+        before = await backend.get("key")
+        await asyncio.sleep(0.1)
+        return before, await backend.get("key")
+
+    assert asyncio.run(run()) == ({"a": 1}, None)
+
+
+def test_lock_is_exclusive_per_name(backend):
+    inside = {"a": 0, "b": 0}
+    most = {"a": 0, "b": 0}
+
+    async def hold(name):
+        async with backend.lock(name):
+            inside[name] += 1
+            most[name] = max(most[name], inside[name])
+            await asyncio.sleep(0.01)
+            inside[name] -= 1
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*(hold(name) for name in "ab" * 4))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    assert most == {"a": 1, "b": 1}
+    # Different names don't wait for each other
+    assert elapsed < 0.3
+
+
+def test_lock_is_released_on_error(backend):
+    async def run():
+        with pytest.raises(ValueError):
+            async with backend.lock("user:1"):
+                raise ValueError
+        async with backend.lock("user:1"):
+            return True
+
+    assert asyncio.run(asyncio.wait_for(run(), 1))
+
+
+def test_in_process_locks_are_dropped_when_unused():
+    backend = InProcessBackend()
+
+    async def hold():
+        async with backend.lock("user:1"):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(hold(), hold(), hold())
+
+    asyncio.run(run())
+    assert backend._locks == {}
+
+
+def test_expired_redis_lock_is_not_released_by_its_old_holder():
+    client = FakeRedis()
+    backend = RedisBackend(client, lock_timeout=0.05)
+
+    async def run():
+        async with backend.lock("user:1"):
+            await asyncio.sleep(0.1)
+            # Taken over by another worker after expiry
+            await client.set("recipe_bot:lock:user:1", "other")
+        return await client.get("recipe_bot:lock:user:1")
+
+    assert asyncio.run(run()) == b"other"
+
+
+def test_sub_second_ttl_is_accepted_by_redis():
+    backend = RedisBackend(FakeRedis())
+
+    async def run():
+        await backend.set("key", [1, 2], ttl=0.5)
+        return await backend.get("key")
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_processor_serializes_a_users_updates_over_redis():
+    processor = PerUserUpdateProcessor(8, RedisBackend(FakeRedis(), lock_timeout=5))
+    running = []
+    overlaps = []
+
+    class Update:
+        def __init__(self, user_id):
+            self.effective_user = type("User", (), {"id": user_id})
+
+    async def handle(user_id):
+        if user_id in running:
+            overlaps.append(user_id)
+        running.append(user_id)
+        await asyncio.sleep(0.01)
+        running.remove(user_id)
+
+    async def run():
+        await asyncio.gather(*(processor.process_update(Update(user_id), handle(user_id))
+                               for user_id in [1, 2, 1, 2, 1]))
+
+    asyncio.run(run())
+    assert overlaps == []
@@ -0,0 +1,67 @@
+import asyncio
+import time
+import types
+
+from src.bot.update_processor import PerUserUpdateProcessor
+from src.services.state_backend import InProcessBackend
+
+
+def _update(user_id):
+    return types.SimpleNamespace(effective_user=types.SimpleNamespace(id=user_id))
+
+
+async def _handle(log, name, seconds):
+    log.append(("start", name))
+    await asyncio.sleep(seconds)
+    log.append(("end", name))
+    return time.perf_counter()
+
+
+def test_queued_updates_of_one_user_do_not_starve_other_users():
+    processor = PerUserUpdateProcessor(4, InProcessBackend())
+    finished = {}
+
+    async def process(name, user_id, seconds):
+        await processor.process_update(_update(user_id), _handle([], name, seconds))
+        finished[name] = time.perf_counter()
+
+    async def run():
+        started = time.perf_counter()
+        busy = [asyncio.create_task(process(f"busy{i}", 1, 0.1)) for i in range(6)]
+        await asyncio.sleep(0.01)
+        await process("other", 2, 0.01)
+        other_done = finished["other"] - started
+        await asyncio.gather(*busy)
+        return other_done
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_updates_of_one_user_run_one_at_a_time_in_order():
+    processor = PerUserUpdateProcessor(8, InProcessBackend())
+    log = []
+
+    async def run():
+        await asyncio.gather(*(processor.process_update(_update(1), _handle(log, i, 0.01)) for i in range(5)))
+
+    asyncio.run(run())
+    assert log == [(event, i) for i in range(5) for event in ("start", "end")]
+
+
+def test_different_users_run_concurrently():
+    processor = PerUserUpdateProcessor(8, InProcessBackend())
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*(processor.process_update(_update(user_id), _handle([], user_id, 0.1))
+                               for user_id in range(5)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 0.3
+
+
+def test_updates_without_user_are_processed():
+    processor = PerUserUpdateProcessor(2, InProcessBackend())
+    log = []
+    asyncio.run(processor.process_update(object(), _handle(log, "custom", 0)))
+    assert log == [("start", "custom"), ("end", "custom")]
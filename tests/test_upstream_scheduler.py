@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.services.spoonacular_client import SpoonacularClient
+from src.services.upstream_scheduler import (BACKGROUND, INTERACTIVE, SPOONACULAR, DailyQuota, QuotaExceededError,
+                                             TokenBucket, UpstreamScheduler, upstream_context)
+
+
+def make_scheduler(rate=20, capacity=1, reserve=10):
+    return UpstreamScheduler({SPOONACULAR: TokenBucket(rate, capacity)},
+                             {SPOONACULAR: DailyQuota(reserve=reserve)})
+
+
+async def _served_order(scheduler, calls):
+    """Names of `calls`, (name, user_id, priority) each, in the order the scheduler let them through."""
+    order = []
+
+    async def call(name):
+        await scheduler.acquire(SPOONACULAR)
+        order.append(name)
+
+    # Use up the burst, so every call below has to queue
+    await scheduler.acquire(SPOONACULAR)
+    tasks = []
+    for name, user_id, priority in calls:
+        with upstream_context(user_id=user_id, priority=priority):
+            tasks.append(asyncio.create_task(call(name)))
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_token_bucket_spaces_out_calls():
+    scheduler = make_scheduler(rate=20, capacity=2)
+
+    async def run():
+        started = time.monotonic()
+        for _ in range(4):
+            await scheduler.acquire(SPOONACULAR)
+        return time.monotonic() - started
+
+    # Two calls go at once, the other two wait 1/20 s each
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_interactive_calls_go_before_background_ones():
+    scheduler = make_scheduler()
+    calls = [("prewarm 1", None, BACKGROUND), ("prewarm 2", None, BACKGROUND),
+             ("user 1", 1, INTERACTIVE), ("user 2", 2, INTERACTIVE)]
+
+    order = asyncio.run(_served_order(scheduler, calls))
+
+    assert order == ["user 1", "user 2", "prewarm 1", "prewarm 2"]
+
+
+def test_users_take_turns():
+    scheduler = make_scheduler()
+    calls = [("1a", 1, INTERACTIVE), ("1b", 1, INTERACTIVE), ("1c", 1, INTERACTIVE),
+             ("2a", 2, INTERACTIVE), ("2b", 2, INTERACTIVE)]
+
+    order = asyncio.run(_served_order(scheduler, calls))
+
+    assert order == ["1a", "2a", "1b", "2b", "1c"]
+
+
+def test_calls_fail_fast_once_the_quota_is_exhausted():
+    scheduler = make_scheduler()
+
+    async def run():
+        await scheduler.acquire(SPOONACULAR)
+        waiting = asyncio.create_task(scheduler.acquire(SPOONACULAR))
+        await asyncio.sleep(0)
+        scheduler.exhaust_quota(SPOONACULAR)
+        with pytest.raises(QuotaExceededError):
+            await scheduler.acquire(SPOONACULAR)
+        # Calls already queued fail when their turn comes
+        with pytest.raises(QuotaExceededError):
+            await waiting
+
+    asyncio.run(run())
+
+
+def test_reserve_is_kept_for_interactive_calls():
+    quota = DailyQuota(reserve=10)
+    quota.record({'X-API-Quota-Used': '142', 'X-API-Quota-Left': '8'})
+
+    quota.check(INTERACTIVE)
+    with pytest.raises(QuotaExceededError):
+        quota.check(BACKGROUND)
+    assert (quota.used, quota.left) == (142, 8)
+
+
+def test_quota_rolls_over_at_the_daily_reset(monkeypatch):
+    quota = DailyQuota(reserve=10)
+    quota.record({'X-API-Quota-Used': '150', 'X-API-Quota-Left': '0'})
+    with pytest.raises(QuotaExceededError):
+        quota.check(INTERACTIVE)
+
+    tomorrow = time.time() + 24 * 60 * 60
+    monkeypatch.setattr(time, 'time', lambda: tomorrow)
+
+    quota.check(BACKGROUND)
+    assert quota.left is None
+
+
+def test_payment_required_response_exhausts_the_quota():
+    requests = []
+
+    def handle(request):
+        requests.append(request)
+        return httpx.Response(402, json={"status": "failure", "code": 402})
+
+    scheduler = make_scheduler(capacity=10)
+    client = SpoonacularClient("key", transport=httpx.MockTransport(handle), scheduler=scheduler)
+
+    async def run():
+        try:
+            for _ in range(2):
+                with pytest.raises(QuotaExceededError):
+                    await client.find_by_ingredients(["egg"], number=1, ranking=1)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+
+    # Not retried, and the second search never reaches Spoonacular
+    assert len(requests) == 1
+
+
+def test_calls_from_worker_threads_keep_their_user_and_priority():
+    scheduler = make_scheduler()
+    order = []
+
+    def call(name):
+        scheduler.acquire_blocking(SPOONACULAR)
+        order.append(name)
+
+    async def run():
+        scheduler.bind(asyncio.get_running_loop())
+        await scheduler.acquire(SPOONACULAR)
+        threads = []
+        for name, priority in (("background", BACKGROUND), ("interactive", INTERACTIVE)):
+            with upstream_context(user_id=1, priority=priority):
+                threads.append(asyncio.create_task(asyncio.to_thread(call, name)))
+            # Both are queued before the next token is due
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*threads)
+
+    asyncio.run(run())
+
+    assert order == ["interactive", "background"]